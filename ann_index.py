@@ -0,0 +1,136 @@
+import numpy as np
+import scipy.sparse as sp
+from knn_engine import normalize_rows
+
+# Lists scanned per query: higher means better recall and slower queries
+DEFAULT_N_PROBE = 8
+
+KMEANS_ITERATIONS = 10
+# Rows per list used to train the coarse centroids
+KMEANS_SAMPLE_PER_LIST = 64
+ASSIGN_BLOCK_ROWS = 4096
+
+def _dense_rows(matrix, positions):
+    """Dense float32 rows of a dense or CSR matrix"""
+    rows = matrix[positions]
+    return rows.toarray() if sp.issparse(rows) else np.asarray(rows)
+
+def _best_centroids(vectors, centroids):
+    """Index of the most similar centroid for every row, computed in row blocks"""
+    assignments = np.empty(vectors.shape[0], dtype=np.int32)
+    for start in range(0, vectors.shape[0], ASSIGN_BLOCK_ROWS):
+        end = start + ASSIGN_BLOCK_ROWS
+        assignments[start:end] = np.asarray(vectors[start:end] @ centroids.T).argmax(axis=1)
+    return assignments
+
+def train_centroids(vectors, n_lists, n_iter=KMEANS_ITERATIONS, seed=0):
+    """Spherical k-means on a sample of L2-normalized rows"""
+    rng = np.random.RandomState(seed)
+    n_rows = vectors.shape[0]
+    sample = rng.choice(n_rows, min(n_rows, n_lists * KMEANS_SAMPLE_PER_LIST), replace=False)
+    sample_vectors = _dense_rows(vectors, np.sort(sample)).astype(np.float32)
+
+    centroids = sample_vectors[rng.choice(len(sample_vectors), n_lists, replace=False)].copy()
+    for _ in range(n_iter):
+        assignments = _best_centroids(sample_vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, sample_vectors)
+        counts = np.bincount(assignments, minlength=n_lists)
+
+        # Empty lists are re-seeded with random sample rows
+        empty = np.flatnonzero(counts == 0)
+        sums[empty] = sample_vectors[rng.choice(len(sample_vectors), len(empty), replace=False)]
+
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = sums / np.where(norms == 0, 1.0, norms)
+    return centroids.astype(np.float32)
+
+class IVFIndex:
+    """Inverted-file cosine index: k-means coarse centroids, only n_probe lists scanned per query"""
+
+    # Rankings can change as more lists are probed
+    approximate = True
+
+    def __init__(self, vectors, centroids, list_offsets, list_positions, n_neighbors=11, n_probe=DEFAULT_N_PROBE):
+        self.vectors = vectors
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_positions = list_positions
+        self.metric = 'cosine'
+        self.n_neighbors = n_neighbors
+        self.n_probe = n_probe
+
+    @classmethod
+    def build(cls, X, n_lists=None, n_neighbors=11, n_probe=DEFAULT_N_PROBE, seed=0):
+        """Normalize X, train the centroids and bucket every row into its nearest list"""
+        _, vectors = normalize_rows(X)
+        n_lists = n_lists or max(1, int(np.sqrt(X.shape[0])))
+        n_lists = min(n_lists, X.shape[0])
+
+        centroids = train_centroids(vectors, n_lists, seed=seed)
+        assignments = _best_centroids(vectors, centroids)
+        list_positions = np.argsort(assignments, kind='stable').astype(np.int32)
+        list_offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        list_offsets[1:] = np.cumsum(np.bincount(assignments, minlength=n_lists))
+        return cls(vectors, centroids, list_offsets, list_positions, n_neighbors, n_probe)
+
+    @classmethod
+    def from_model(cls, knn_model, X, n_lists=None, n_probe=DEFAULT_N_PROBE):
+        """Index with the neighbor count of a fitted cosine NearestNeighbors model"""
+        if knn_model.effective_metric_ != 'cosine':
+            raise ValueError("IVFIndex only supports the cosine metric")
+        return cls.build(X, n_lists=n_lists, n_neighbors=knn_model.n_neighbors, n_probe=n_probe)
+
+    def __len__(self):
+        return self.vectors.shape[0]
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    def candidates(self, query, n_probe=None):
+        """Row positions in the n_probe lists closest to a normalized query"""
+        n_probe = min(n_probe or self.n_probe, self.n_lists)
+        centroid_scores = self.centroids @ query
+        probed = np.argpartition(-centroid_scores, n_probe - 1)[:n_probe]
+        return np.concatenate([self.list_positions[self.list_offsets[i]:self.list_offsets[i + 1]] for i in probed])
+
+    def query(self, vector, n_neighbors=None, n_probe=None, allowed=None):
+        """(cosine distances, indices) of the approximate nearest rows, closest first (only rows set in `allowed`)"""
+        n_neighbors = n_neighbors or self.n_neighbors
+        query = np.asarray(vector.toarray() if sp.issparse(vector) else vector, dtype=np.float32).ravel()
+        norm = np.linalg.norm(query)
+        query = query / norm if norm else query
+
+        n_probe = min(n_probe or self.n_probe, self.n_lists)
+        candidates = self.candidates(query, n_probe)
+        if allowed is not None:
+            candidates = candidates[allowed[candidates]]
+        # Probe twice as many lists until enough (allowed) rows are found, so deep pages
+        # and rare filters get n_neighbors rows whenever the catalog has them
+        while len(candidates) < n_neighbors and n_probe < self.n_lists:
+            n_probe = min(2 * n_probe, self.n_lists)
+            candidates = self.candidates(query, n_probe)
+            if allowed is not None:
+                candidates = candidates[allowed[candidates]]
+        scores = np.asarray(self.vectors[candidates] @ query).ravel().astype(np.float64)
+        if len(candidates) > n_neighbors:
+            top = np.argpartition(-scores, n_neighbors - 1)[:n_neighbors]
+            candidates, scores = candidates[top], scores[top]
+        # Ties are broken by row position so results are deterministic
+        order = np.lexsort((candidates, -scores))
+        return np.clip(1.0 - scores[order], 0, 2), candidates[order]
+
+    def profile(self, positions, weights=None):
+        """Weighted mean of normalized catalog rows, usable as one query vector"""
+        rows = _dense_rows(self.vectors, positions).astype(np.float64)
+        weights = np.ones(len(rows)) if weights is None else np.asarray(weights, dtype=np.float64)
+        return weights @ rows / weights.sum()
+
+    def kneighbors(self, position, n_neighbors=None, n_probe=None, allowed=None):
+        """Approximate neighbors of a catalog row, the row itself included"""
+        return self.query(_dense_rows(self.vectors, [position])[0], n_neighbors, n_probe, allowed)
+
+    def kneighbors_batch(self, positions, n_neighbors=None, n_probe=None):
+        """kneighbors for many catalog rows"""
+        return [self.kneighbors(position, n_neighbors, n_probe) for position in positions]
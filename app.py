@@ -1,12 +1,60 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, g, request, jsonify, render_template, make_response
 from flask_cors import CORS
-import pandas as pd
 import numpy as np
 import joblib
 import os
+import threading
+from types import SimpleNamespace
+from movie_index import MovieIdIndex
+from title_search import TitleSearchIndex, TitleSuggestIndex
+from text_search import OverviewSearchIndex
+from filter_index import MovieFilterIndex
+from block_weights import BlockWeightedScorer, parse_weights
+from serialization import FastJSONProvider, compress_response
+from response_cache import ResponseCache, SharedResponseCache, artifact_version, conditional
+from catalog_snapshot import SNAPSHOT_PATH, load_catalog
+from card_store import CARD_FIELDS, DETAIL_FIELDS, MovieCardStore, parse_fields
+from feature_store import GENRE_COLUMNS, build_feature_matrix, load_feature_matrix, save_feature_matrix
+from knn_engine import CandidateCache, KNNEngine, exclude_position
+from ann_index import IVFIndex
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for frontend communication
+# orjson encoding, msgpack on request and gzip/brotli for large bodies
+app.json = FastJSONProvider(app)
+app.after_request(compress_response)
+
+# Set SHARED_CACHE_PATH (e.g. response_cache.sqlite) to share cached responses between worker processes
+SHARED_CACHE_PATH = os.environ.get('SHARED_CACHE_PATH', '')
+
+# Files whose contents invalidate cached responses and ETags; the snapshot and the feature manifest
+# are rebuilt deterministically from the CSVs and models, so they stand in for both
+ARTIFACT_PATHS = ['improved_knn_model.joblib', 'improved_tfidf_vectorizer.joblib', 'improved_scaler.joblib',
+                  'improved_features.json', SNAPSHOT_PATH]
+
+# Largest number of seed movies accepted by /api/recommend/batch
+MAX_BATCH_SIZE = 500
+
+# Completions returned by /api/suggest
+MAX_SUGGESTIONS = 10
+
+# Default number of /api/search/text results
+TEXT_SEARCH_RESULTS = 20
+
+# Largest page size (`k`) and deepest result (`cursor` + `k`) for recommendations
+MAX_K = 100
+MAX_RECOMMENDATION_DEPTH = 1000
+
+# Set ANN_N_PROBE (e.g. 8) to serve recommendations from the approximate IVF index instead of exact search
+ANN_N_PROBE = int(os.environ.get('ANN_N_PROBE', '0'))
+
+# Set ENABLE_RELOAD=1 to accept POST /api/reload, from localhost only
+ENABLE_RELOAD = os.environ.get('ENABLE_RELOAD', '') == '1'
+LOCAL_ADDRESSES = ('127.0.0.1', '::1')
+
+# Everything load_models() builds; all None when nothing could be loaded (mock data is served)
+MODEL_NAMES = ('knn_model', 'tfidf_vectorizer', 'movies_df', 'X', 'scaler', 'movie_index', 'card_store', 'knn_engine',
+               'candidate_cache', 'title_index', 'suggest_index', 'text_index', 'filter_index', 'block_scorer', 'version')
 
 # Load the trained models and data
 def load_models():
@@ -24,145 +72,119 @@ def load_models():
         scaler = joblib.load('improved_scaler.joblib')
         print(" Improved scaler loaded")
         
-        print("Loading movie data...")
-        movies_df = pd.read_csv('movies_preprocessed.csv', low_memory=False)
-        
-        # Load original metadata for poster paths
-        print("Loading poster data...")
-        original_df = pd.read_csv('movies_metadata.csv', low_memory=False)
-        # Merge poster paths
-        movies_df = movies_df.merge(original_df[['id', 'poster_path', 'release_date']], on='id', how='left', suffixes=('', '_orig'))
-        
+        # One typed, columnar snapshot instead of parsing and merging both CSVs
+        movies_df = load_catalog()
         print(f" Loaded {len(movies_df)} movies with poster data")
         
-        # Preprocess the data (same as in model.py)
-        movies_df['adult'] = movies_df['adult'].map({'True': 1, 'False': 0, True: 1, False: 0})
-        text_data = movies_df['overview'].fillna('') + ' ' + movies_df['original_title'].fillna('')
-        
-        # Improved TF-IDF with same parameters as training
-        text_features = tfidf_vectorizer.transform(text_data).toarray()
-        
-        # Extract genre features
-        genre_columns = ['Action', 'Adventure', 'Animation', 'Comedy', 'Crime', 'Documentary', 
-                        'Drama', 'Family', 'Fantasy', 'Horror', 'Music', 'Mystery', 
-                        'Romance', 'Science Fiction', 'Thriller', 'War', 'Western']
-        available_genres = [col for col in genre_columns if col in movies_df.columns]
-        genre_features = movies_df[available_genres].fillna(0).values
-        
-        # Extract language features
-        language_columns = [col for col in movies_df.columns if col in ['en', 'fr', 'es', 'de', 'it', 'ja', 'ko', 'zh']]
-        language_features = movies_df[language_columns].fillna(0).values if language_columns else np.zeros((len(movies_df), 1))
-        
-        # Extract and scale numerical features
-        numerical_features = movies_df[['budget_norm', 'adult']].fillna(0).values
-        numerical_features_scaled = scaler.transform(numerical_features)
-        
-        # Apply same weights as in training
-        text_weight = 1.0
-        genre_weight = 3.0
-        language_weight = 0.5
-        numerical_weight = 0.5
-        
-        weighted_text = text_features * text_weight
-        weighted_genres = genre_features * genre_weight
-        weighted_languages = language_features * language_weight
-        weighted_numerical = numerical_features_scaled * numerical_weight
-        
-        # Combine all features
-        X = np.hstack([
-            weighted_text,
-            weighted_genres, 
-            weighted_languages,
-            weighted_numerical
-        ])
-        
-        print(" Improved models and data loaded successfully!")
-        return knn_model, tfidf_vectorizer, movies_df, X, scaler
+        # Build the id -> row position index once instead of scanning per request
+        movie_index = MovieIdIndex(movies_df)
+        print(f" Indexed {len(movie_index)} movie ids ({movie_index.malformed_count} malformed, {movie_index.duplicate_count} duplicates skipped)")
+        
+        # Reuse the feature matrix saved by improved_model.py while it matches the models and movie rows
+        X, feature_manifest = load_feature_matrix('improved_features', movie_index.ids, 'improved_tfidf_vectorizer.joblib', 'improved_scaler.joblib')
+        if X is not None:
+            print(f"  Memory-mapped feature matrix {X.shape} from {feature_manifest['matrix_file']}")
+            feature_blocks = feature_manifest['blocks']
+        else:
+            print("Building feature matrix...")
+            X, feature_blocks = build_feature_matrix(movies_df, tfidf_vectorizer, scaler)
+            try:
+                save_feature_matrix('improved_features', X, movie_index.ids, feature_blocks, 'improved_tfidf_vectorizer.joblib', 'improved_scaler.joblib')
+                print(f"  Feature matrix {X.shape} saved for the next start")
+            except OSError as e:
+                print(f"Could not save feature matrix: {e}")
+        
+        if ANN_N_PROBE:
+            # Approximate search for large catalogs: only the n_probe closest k-means lists are scanned
+            knn_engine = IVFIndex.from_model(knn_model, X, n_probe=ANN_N_PROBE)
+            print(f" IVF index ready ({knn_engine.n_lists} lists, n_probe={ANN_N_PROBE})")
+        else:
+            # Pre-normalized float32 copy of X answers kneighbors with one mat-vec per request
+            knn_engine = KNNEngine.from_model(knn_model, X)
+            print(f" kNN engine ready ({knn_engine.metric}, {knn_engine.n_neighbors} neighbors)")
+        
+        # Per-block norms of the normalized rows, so request-time block weights need no rebuild of X
+        block_scorer = BlockWeightedScorer(knn_engine.vectors if ANN_N_PROBE else knn_engine.scan_matrix, feature_blocks,
+                                           text_terms=tfidf_vectorizer.get_feature_names_out())
+        
+        # Sorted candidate lists per seed, reused by "show more" pages
+        candidate_cache = CandidateCache(knn_engine)
+        
+        # Card fields (overview, year, genres, poster URL) are computed once for every movie
+        card_store = MovieCardStore(movies_df, GENRE_COLUMNS, movie_index.ids)
+        print(f" Built {len(card_store)} movie cards")
+        
+        # Accent-folded n-gram index over original and localized titles, so searches never scan the DataFrame
+        title_index = TitleSearchIndex([movies_df['original_title'], movies_df['title']])
+        # Sorted original and localized titles for prefix autocomplete, most popular first
+        suggest_index = TitleSuggestIndex([movies_df['original_title'], movies_df['title']],
+                                          movies_df['popularity'], movie_index.ids)
+        # Normalized TF-IDF rows (the text block of X) for free-text overview search
+        text_index = OverviewSearchIndex.from_features(X, tfidf_vectorizer)
+        print(f" Text search index ready ({text_index.matrix.nnz} TF-IDF entries)")
+        # Genre/language/adult bitsets and a sorted year array for search and browse filters
+        filter_index = MovieFilterIndex(movies_df)
+        print(f" Filter index ready ({len(filter_index.genre_bits)} genres, {len(filter_index.language_bits)} languages)")
+        
+        # Content hashes taken after any stale snapshot or feature matrix was rebuilt, so workers
+        # starting together agree on the version
+        version = artifact_version(ARTIFACT_PATHS)
+        print(f" Improved models and data loaded successfully! (version {version})")
+        return SimpleNamespace(knn_model=knn_model, tfidf_vectorizer=tfidf_vectorizer, movies_df=movies_df, X=X, scaler=scaler,
+                               movie_index=movie_index, card_store=card_store, knn_engine=knn_engine, candidate_cache=candidate_cache,
+                               title_index=title_index, suggest_index=suggest_index, text_index=text_index, filter_index=filter_index,
+                               block_scorer=block_scorer, version=version)
         
     except Exception as e:
         print(f" Error loading models: {e}")
         print(" Try running: python improved_model.py")
-        return None, None, None, None, None
-
-# Helper function to get movie genres
-def get_movie_genres(row):
-    """Extract genres for a movie row"""
-    genre_columns = ['Action', 'Adventure', 'Animation', 'Comedy', 'Crime', 'Documentary', 
-                    'Drama', 'Family', 'Fantasy', 'Horror', 'Music', 'Mystery', 
-                    'Romance', 'Science Fiction', 'Thriller', 'War', 'Western']
-    
-    if movies_df is not None:
-        available_genres = [col for col in genre_columns if col in movies_df.columns]
-        return [genre for genre in available_genres if row[genre] == 1]
-    return []
-
-# Helper function to get poster URL with fallbacks
-def get_poster_url(row, title, genres=None):
-    """Get poster URL with multiple fallback options and genre-based colors"""
-    # First try TMDB poster path
-    if pd.notna(row.get('poster_path')) and str(row.get('poster_path')).strip():
-        poster_path = str(row['poster_path']).strip()
-        if not poster_path.startswith('/'):
-            poster_path = '/' + poster_path
-        return f"https://image.tmdb.org/t/p/w500{poster_path}"
-    
-    # Genre-based color schemes
-    genre_colors = {
-        'Action': ('8B0000', 'FFD700'),      # Dark red, gold
-        'Adventure': ('228B22', 'FFFFFF'),    # Forest green, white
-        'Animation': ('FF69B4', 'FFFFFF'),    # Hot pink, white
-        'Comedy': ('FF8C00', 'FFFFFF'),       # Dark orange, white
-        'Crime': ('2F4F4F', 'FF0000'),        # Dark slate gray, red
-        'Drama': ('4B0082', 'FFFFFF'),        # Indigo, white
-        'Family': ('32CD32', 'FFFFFF'),       # Lime green, white
-        'Fantasy': ('9370DB', 'FFD700'),      # Medium purple, gold
-        'Horror': ('000000', 'FF0000'),       # Black, red
-        'Romance': ('DC143C', 'FFFFFF'),      # Crimson, white
-        'Science Fiction': ('4169E1', 'FFFFFF'), # Royal blue, white
-        'Thriller': ('8B0000', 'FFFFFF'),     # Dark red, white
-        'War': ('556B2F', 'FFFFFF'),          # Dark olive green, white
-        'Western': ('D2691E', 'FFFFFF'),      # Chocolate, white
-    }
-    
-    # Default colors
-    bg_color, text_color = '1a1a2e', 'ffffff'
-    
-    # Find genre-based colors
-    if genres:
-        for genre in genres:
-            if genre in genre_colors:
-                bg_color, text_color = genre_colors[genre]
-                break
-    
-    # Fallback: Generate poster from title
-    if title and title != "Unknown Title":
-        # Clean title for URL - remove special characters and limit length
-        import re
-        clean_title = re.sub(r'[^\w\s-]', '', str(title))
-        clean_title = re.sub(r'\s+', '+', clean_title.strip())
-        clean_title = clean_title[:25]  # Limit length
-        
-        if clean_title:
-            return f"https://via.placeholder.com/300x450/{bg_color}/{text_color}?text={clean_title}"
-        else:
-            return f"https://via.placeholder.com/300x450/{bg_color}/{text_color}?text=Movie"
-    
-    # Final fallback
-    return f"https://via.placeholder.com/300x450/{bg_color}/{text_color}?text=No+Poster"
+        return None
 
-def filter_movies_with_posters(movies_df, limit=50):
-    """Filter movies that have poster paths for better user experience"""
-    # First try to get movies with poster paths
-    movies_with_posters = movies_df[movies_df['poster_path'].notna()]
-    
-    if len(movies_with_posters) >= limit:
-        return movies_with_posters.head(limit)
-    else:
-        # If not enough movies with posters, include some without
-        return movies_df.head(limit)
+# Load models; requests read them through g.models, and a reload replaces the whole namespace at once
+current_models = load_models() or SimpleNamespace(**dict.fromkeys(MODEL_NAMES))
+reload_lock = threading.Lock()
+
+# Finished /api/recommend, /api/movie and /api/search responses, keyed on the artifact version of the
+# request's models so a response computed during a reload is never served for the new models
+response_cache = ResponseCache(shared=SharedResponseCache(SHARED_CACHE_PATH, current_models.version) if SHARED_CACHE_PATH else None,
+                               version_fn=lambda: g.models.version)
 
-# Load models
-knn_model, tfidf_vectorizer, movies_df, X, scaler = load_models()
+@app.before_request
+def pin_models():
+    """Use one set of models for the whole request, even if a reload swaps them meanwhile"""
+    g.models = current_models
+
+def reload_models():
+    """Load the models and data again and swap them in at once; the old ones stay on failure"""
+    global current_models
+    with reload_lock:
+        models = load_models()
+        if models is None:
+            return False
+        current_models = models
+        # Entries of the old version can no longer be hit; free their memory
+        response_cache.clear()
+        if response_cache.shared is not None:
+            response_cache.shared.version = models.version
+        return True
+
+def parse_k(value):
+    """Number of recommendations to return; the fitted model's count by default"""
+    if value is None:
+        return g.models.knn_model.n_neighbors - 1
+    k = int(value)
+    if not 1 <= k <= MAX_K:
+        raise ValueError(f"k must be between 1 and {MAX_K}")
+    return k
+
+def parse_cursor(value):
+    """Offset into the ranked recommendations, as returned in next_cursor"""
+    if value is None:
+        return 0
+    offset = int(value)
+    if not 0 <= offset <= MAX_RECOMMENDATION_DEPTH:
+        raise ValueError("Invalid cursor")
+    return offset
 
 @app.route('/')
 def home():
@@ -175,7 +197,8 @@ def api_info():
 @app.route('/api/movies', methods=['GET'])
 def get_movies():
     """Get all movies with basic info"""
-    if movies_df is None:
+    models = g.models
+    if models.movies_df is None:
         # Return mock data if models aren't loaded
         return jsonify({
             "movies": [
@@ -187,54 +210,27 @@ def get_movies():
             ]
         })
     
-    # Return movies with posters prioritized
-    filtered_movies = filter_movies_with_posters(movies_df, 50)
-    movies_list = []
-    for idx, row in filtered_movies.iterrows():
-        # Handle NaN values properly
-        overview = row['overview'] if pd.notna(row['overview']) else "No overview available"
-        title = row['original_title'] if pd.notna(row['original_title']) else "Unknown Title"
-        
-        # Truncate overview if too long
-        if len(str(overview)) > 200:
-            overview = str(overview)[:200] + "..."
-        
-        # Extract year from release_date
-        year = 2000  # default
-        if pd.notna(row.get('release_date')):
-            try:
-                year_str = str(row['release_date'])[:4]
-                year = int(year_str) if year_str.isdigit() else 2000
-            except:
-                year = 2000
-        
-        # Get poster URL with fallback
-        movie_genres = get_movie_genres(row)
-        poster_url = get_poster_url(row, str(title), movie_genres)
-        
-        # Safely convert ID to integer
-        try:
-            movie_id_val = int(float(str(row.get('id', idx))))
-        except (ValueError, TypeError):
-            movie_id_val = idx
-            
-        movies_list.append({
-            "id": movie_id_val,
-            "title": str(title),
-            "overview": str(overview),
-            "year": year,
-            "genre": movie_genres[0] if movie_genres else "drama",  # Use actual primary genre
-            "img": poster_url
-        })
+    try:
+        allowed = models.filter_index.parse_mask(request.args)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid filter: {str(e)}"}), 400
     
-    return jsonify({"movies": movies_list})
+    try:
+        fields = parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({"error": f"Invalid fields: {str(e)}"}), 400
+    
+    # Return movies with posters prioritized; only the requested card columns are gathered
+    return jsonify({"movies": models.card_store.cards(models.card_store.poster_first(50, allowed), fields)})
 
 @app.route('/api/search', methods=['GET'])
+@response_cache.cached
 def search_movies():
     """Search movies by title"""
+    models = g.models
     query = request.args.get('q', '').lower()
     
-    if movies_df is None:
+    if models.movies_df is None:
         # Return mock search results
         mock_movies = [
             {"id": 1, "title": "The Shawshank Redemption", "overview": "Two imprisoned men bond over a number of years...", "year": 1994, "genre": "drama", "img": "https://image.tmdb.org/t/p/w500/q6y0Go1tsGEsmtFryDOJo3dEmqu.jpg"},
@@ -247,110 +243,77 @@ def search_movies():
     if not query:
         return jsonify({"movies": []})
     
-    # Filter movies by title
-    filtered_movies = movies_df[movies_df['original_title'].str.lower().str.contains(query, na=False)]
+    try:
+        # Filters are applied before the 20-result cut
+        allowed = models.filter_index.parse_mask(request.args)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid filter: {str(e)}"}), 400
     
-    movies_list = []
-    for idx, row in filtered_movies.head(20).iterrows():
-        # Handle NaN values properly
-        overview = row['overview'] if pd.notna(row['overview']) else "No overview available"
-        title = row['original_title'] if pd.notna(row['original_title']) else "Unknown Title"
-        
-        # Truncate overview if too long
-        if len(str(overview)) > 200:
-            overview = str(overview)[:200] + "..."
-        
-        # Extract year from release_date
-        year = 2000  # default
-        if pd.notna(row.get('release_date')):
-            try:
-                year_str = str(row['release_date'])[:4]
-                year = int(year_str) if year_str.isdigit() else 2000
-            except:
-                year = 2000
-        
-        # Get poster URL with fallback
-        movie_genres = get_movie_genres(row)
-        poster_url = get_poster_url(row, str(title), movie_genres)
-        
-        # Safely convert ID to integer
-        try:
-            movie_id_val = int(float(str(row.get('id', idx))))
-        except (ValueError, TypeError):
-            movie_id_val = idx
-            
-        movies_list.append({
-            "id": movie_id_val,
-            "title": str(title),
-            "overview": str(overview),
-            "year": year,
-            "genre": movie_genres[0] if movie_genres else "drama",
-            "img": poster_url
-        })
+    try:
+        fields = parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({"error": f"Invalid fields: {str(e)}"}), 400
     
-    return jsonify({"movies": movies_list})
+    if request.args.get('fuzzy') in ('1', 'true'):
+        # Typo tolerant: literal matches first, then titles sharing most of the query's trigrams
+        positions = models.title_index.fuzzy_search(query, limit=20, allowed=allowed)
+    else:
+        # Literal substring match on the title index (exact and prefix matches first)
+        positions = models.title_index.search(query, limit=20, allowed=allowed)
+    return jsonify({"movies": models.card_store.cards(positions, fields)})
+
+@app.route('/api/search/text', methods=['GET'])
+def search_overviews():
+    """Search movie overviews and titles with a free-text query"""
+    models = g.models
+    query = request.args.get('q', '')
+    
+    if models.text_index is None or not query.strip():
+        return jsonify({"movies": []})
+    
+    try:
+        k = int(request.args.get('k', TEXT_SEARCH_RESULTS))
+        if not 1 <= k <= MAX_K:
+            raise ValueError(f"k must be between 1 and {MAX_K}")
+    except ValueError as e:
+        return jsonify({"error": f"Invalid k: {str(e)}"}), 400
+    
+    # One sparse product of the query's TF-IDF vector with the matching term columns
+    positions, scores = models.text_index.search(query, limit=k)
+    movies = models.card_store.cards(positions)
+    for movie, score in zip(movies, scores):
+        movie["score"] = score
+    return jsonify({"movies": movies})
+
+@app.route('/api/suggest', methods=['GET'])
+def suggest_titles():
+    """Autocomplete titles starting with the query"""
+    models = g.models
+    query = request.args.get('q', '')
+    
+    if models.suggest_index is None or not query.strip():
+        return jsonify({"suggestions": []})
+    
+    suggestions = models.suggest_index.suggest(query, limit=MAX_SUGGESTIONS)
+    return jsonify({"suggestions": [{"id": movie_id, "title": title} for movie_id, title in suggestions]})
 
 @app.route('/api/movie/<int:movie_id>', methods=['GET'])
+@conditional(lambda: g.models.version)
+@response_cache.cached
 def get_movie_details(movie_id):
     """Get details for a specific movie"""
-    if movies_df is None:
+    models = g.models
+    if models.movies_df is None:
         return jsonify({"error": "Movies data not loaded"}), 500
     
     try:
         # Find movie by ID
-        movie_row = None
-        for idx, row in movies_df.iterrows():
-            try:
-                row_id = int(float(str(row.get('id', idx))))
-                if row_id == movie_id:
-                    movie_row = row
-                    break
-            except (ValueError, TypeError):
-                continue
+        movie_idx = models.movie_index.position(movie_id)
         
-        if movie_row is None:
+        if movie_idx is None:
             return jsonify({"error": f"Movie with ID {movie_id} not found"}), 404
         
-        # Handle NaN values properly
-        overview = movie_row['overview'] if pd.notna(movie_row['overview']) else "No overview available"
-        title = movie_row['original_title'] if pd.notna(movie_row['original_title']) else "Unknown Title"
-        
-        # Extract year from release_date
-        year = 2000  # default
-        if pd.notna(movie_row.get('release_date')):
-            try:
-                year_str = str(movie_row['release_date'])[:4]
-                year = int(year_str) if year_str.isdigit() else 2000
-            except:
-                year = 2000
-        
-        # Get genres for this movie
-        genre_columns = ['Action', 'Adventure', 'Animation', 'Comedy', 'Crime', 'Documentary', 
-                        'Drama', 'Family', 'Fantasy', 'Horror', 'Music', 'Mystery', 
-                        'Romance', 'Science Fiction', 'Thriller', 'War', 'Western']
-        available_genres = [col for col in genre_columns if col in movies_df.columns]
-        movie_genres = [genre for genre in available_genres if movie_row[genre] == 1]
-        
-        # Get poster URL with fallback
-        movie_genres = get_movie_genres(movie_row)
-        poster_url = get_poster_url(movie_row, str(title), movie_genres)
-        
-        # Safely convert ID to integer
-        try:
-            movie_id_val = int(float(str(movie_row.get('id', movie_id))))
-        except (ValueError, TypeError):
-            movie_id_val = movie_id
-        
-        movie_details = {
-            "id": movie_id_val,
-            "title": str(title),
-            "overview": str(overview),
-            "year": year,
-            "genres": movie_genres,
-            "img": poster_url,
-            "budget": float(movie_row.get('budget_norm', 0)) if pd.notna(movie_row.get('budget_norm')) else 0,
-            "adult": bool(movie_row.get('adult', False))
-        }
+        movie_details = models.card_store.card(movie_idx, DETAIL_FIELDS)
         
         return jsonify({"movie": movie_details})
         
@@ -359,154 +322,229 @@ def get_movie_details(movie_id):
         return jsonify({"error": f"Failed to get movie details: {str(e)}"}), 500
 
 @app.route('/api/recommend/<int:movie_id>', methods=['GET'])
+@conditional(lambda: g.models.version)
+@response_cache.cached
 def recommend_movies(movie_id):
     """Get recommendations for a specific movie"""
-    if knn_model is None or movies_df is None or X is None:
+    models = g.models
+    if models.knn_model is None or models.movies_df is None or models.X is None:
         return jsonify({"error": "Models not loaded"}), 500
     
+    try:
+        k = parse_k(request.args.get('k'))
+        offset = parse_cursor(request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({"error": f"Invalid paging parameters: {str(e)}"}), 400
+    
+    try:
+        # Optional genre/year/language/adult constraints, applied inside the neighbor search
+        allowed = models.filter_index.parse_mask(request.args)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid filter: {str(e)}"}), 400
+    
+    try:
+        # Optional text_weight/genre_weight/language_weight/numerical_weight overrides
+        weights = parse_weights(request.args)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid block weights: {str(e)}"}), 400
+    
+    try:
+        fields = parse_fields(request.args.get('fields'), extra=('similarity_score',))
+    except ValueError as e:
+        return jsonify({"error": f"Invalid fields: {str(e)}"}), 400
+    
     try:
         # Find movie index by ID
-        movie_idx = None
-        movie_row = None
-        for idx, row in movies_df.iterrows():
-            try:
-                row_id = int(float(str(row.get('id', idx))))
-                if row_id == movie_id:
-                    movie_idx = idx
-                    movie_row = row
-                    break
-            except (ValueError, TypeError):
-                # If ID conversion fails, skip this row
-                continue
+        movie_idx = models.movie_index.position(movie_id)
         
         if movie_idx is None:
             return jsonify({"error": f"Movie with ID {movie_id} not found"}), 404
         
-        print(f"Finding recommendations for: {movie_row['original_title']}")
+        selected_movie_title = models.card_store.columns['title'][movie_idx]
         
-        # Get recommendations using improved model
-        distances, indices = knn_model.kneighbors([X[movie_idx]])
-        recommended_indices = indices[0][1:]  # Exclude the movie itself
+        print(f"Finding recommendations for: {selected_movie_title}")
+        
+        # Page through the seed's cached, sorted candidate list (same ranking as knn_model.kneighbors)
+        depth = min(offset + k, MAX_RECOMMENDATION_DEPTH)
+        if weights is None:
+            distances, indices = models.candidate_cache.neighbors(movie_idx, depth, allowed)
+        else:
+            # Custom block weights: one scan scoring every block with the requested weights
+            distances, indices = models.block_scorer.kneighbors(movie_idx, depth + 1, weights, allowed)
+            distances, indices = exclude_position(distances, indices, movie_idx, depth)
+        recommended_indices = indices[offset:depth]
         
         # Convert cosine distances to similarity scores (cosine distance = 1 - cosine similarity)
-        similarities = 1 - distances[0][1:]
-        
-        recommendations = []
-        for i, idx in enumerate(recommended_indices):
-            row = movies_df.iloc[idx]
-            
-            # Handle NaN values properly
-            overview = row['overview'] if pd.notna(row['overview']) else "No overview available"
-            title = row['original_title'] if pd.notna(row['original_title']) else "Unknown Title"
-            
-            # Truncate overview if too long
-            if len(str(overview)) > 200:
-                overview = str(overview)[:200] + "..."
-            
-            # Extract year from release_date
-            year = 2000  # default
-            if pd.notna(row.get('release_date')):
-                try:
-                    year_str = str(row['release_date'])[:4]
-                    year = int(year_str) if year_str.isdigit() else 2000
-                except:
-                    year = 2000
-            
-            # Use improved similarity score from cosine similarity
-            similarity_score = float(similarities[i])
-            
-            # Get poster URL with fallback
-            movie_genres = get_movie_genres(row)
-            poster_url = get_poster_url(row, str(title), movie_genres)
-            
-            # Safely convert ID to integer
-            try:
-                movie_id_val = int(float(str(row.get('id', idx))))
-            except (ValueError, TypeError):
-                movie_id_val = idx
-            
-            recommendations.append({
-                "id": movie_id_val,
-                "title": str(title),
-                "overview": str(overview),
-                "year": year,
-                "genre": movie_genres[0] if movie_genres else "drama",
-                "similarity_score": similarity_score,
-                "img": poster_url
-            })
-        
-        selected_movie_title = str(movie_row['original_title']) if pd.notna(movie_row['original_title']) else "Unknown Title"
+        similarities = 1 - distances[offset:depth]
+        
+        recommendations = models.card_store.cards(recommended_indices, [field for field in fields if field in CARD_FIELDS])
+        if 'similarity_score' in fields:
+            for recommendation, similarity_score in zip(recommendations, similarities):
+                # Use improved similarity score from cosine similarity
+                recommendation["similarity_score"] = similarity_score
+        
+        if request.args.get('explain') in ('1', 'true'):
+            # Per-block score breakdown and shared TF-IDF terms, computed on the returned rows only
+            explanations = models.block_scorer.explain(movie_idx, recommended_indices, weights)
+            for recommendation, explanation in zip(recommendations, explanations):
+                recommendation["explanation"] = explanation
+        
+        # More results exist while the page was full and the depth limit is not reached
+        n_others = len(models.card_store) - 1 if allowed is None else int(allowed.sum()) - int(allowed[movie_idx])
+        has_more = len(indices) == depth and depth < min(MAX_RECOMMENDATION_DEPTH, n_others)
         
         return jsonify({
             "movie": {
                 "id": movie_id,
                 "title": selected_movie_title
             },
-            "recommendations": recommendations
+            "recommendations": recommendations,
+            "next_cursor": str(depth) if has_more else None
         })
         
     except Exception as e:
         print(f"Recommendation error: {e}")
         return jsonify({"error": f"Recommendation failed: {str(e)}"}), 500
 
+@app.route('/api/recommend/batch', methods=['POST'])
+def recommend_batch():
+    """Get recommendations for many movies in one request"""
+    models = g.models
+    if models.knn_model is None or models.movies_df is None or models.X is None:
+        return jsonify({"error": "Models not loaded"}), 500
+    
+    payload = request.get_json(silent=True) or {}
+    movie_ids = payload.get('movie_ids')
+    if not isinstance(movie_ids, list) or not movie_ids:
+        return jsonify({"error": "Request body must be JSON with a non-empty 'movie_ids' list"}), 400
+    if len(movie_ids) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"At most {MAX_BATCH_SIZE} movie ids per batch"}), 400
+    try:
+        k = parse_k(payload.get('k'))
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid k: {str(e)}"}), 400
+    
+    try:
+        # Resolve every id in one pass; invalid and unknown ids are reported per item
+        results = []
+        result_positions = []
+        for movie_id in movie_ids:
+            if not isinstance(movie_id, int) or isinstance(movie_id, bool):
+                results.append({"movie_id": movie_id, "error": "Movie id must be an integer"})
+                result_positions.append(None)
+                continue
+            movie_idx = models.movie_index.position(movie_id)
+            if movie_idx is None:
+                results.append({"movie_id": movie_id, "error": f"Movie with ID {movie_id} not found"})
+            else:
+                results.append({"movie_id": movie_id})
+            result_positions.append(movie_idx)
+        
+        # Score all distinct seeds together with blocked matrix products
+        positions = sorted({movie_idx for movie_idx in result_positions if movie_idx is not None})
+        neighbors = dict(zip(positions, models.knn_engine.kneighbors_batch(positions, k + 1)))
+        
+        for result, movie_idx in zip(results, result_positions):
+            if movie_idx is None:
+                continue
+            # Exclude the movie itself
+            distances, indices = exclude_position(*neighbors[movie_idx], movie_idx, k)
+            recommendations = models.card_store.cards(indices)
+            for recommendation, similarity_score in zip(recommendations, 1 - distances):
+                recommendation["similarity_score"] = similarity_score
+            result["movie"] = {"id": result["movie_id"], "title": models.card_store.columns['title'][movie_idx]}
+            result["recommendations"] = recommendations
+        
+        return jsonify({"results": results})
+        
+    except Exception as e:
+        print(f"Batch recommendation error: {e}")
+        return jsonify({"error": f"Batch recommendation failed: {str(e)}"}), 500
+
+@app.route('/api/recommend/profile', methods=['POST'])
+def recommend_profile():
+    """Get recommendations for a set of liked movies ("more like these")"""
+    models = g.models
+    if models.knn_model is None or models.movies_df is None or models.X is None:
+        return jsonify({"error": "Models not loaded"}), 500
+    
+    payload = request.get_json(silent=True) or {}
+    movie_ids = payload.get('movie_ids')
+    weights = payload.get('weights')
+    if not isinstance(movie_ids, list) or not movie_ids:
+        return jsonify({"error": "Request body must be JSON with a non-empty 'movie_ids' list"}), 400
+    if len(movie_ids) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"At most {MAX_BATCH_SIZE} movie ids per profile"}), 400
+    if weights is not None and (not isinstance(weights, list) or len(weights) != len(movie_ids)
+                                or not all(isinstance(w, (int, float)) and not isinstance(w, bool) and w >= 0 for w in weights)):
+        return jsonify({"error": "'weights' must be a list of non-negative numbers, one per movie id"}), 400
+    try:
+        k = parse_k(payload.get('k'))
+        allowed = models.filter_index.parse_mask(request.args)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid parameters: {str(e)}"}), 400
+    
+    try:
+        # Unknown ids are reported back instead of failing the whole profile
+        seeds = []
+        seed_weights = []
+        unknown_ids = []
+        for i, movie_id in enumerate(movie_ids):
+            movie_idx = models.movie_index.position(movie_id) if isinstance(movie_id, int) and not isinstance(movie_id, bool) else None
+            if movie_idx is None:
+                unknown_ids.append(movie_id)
+                continue
+            seeds.append(movie_idx)
+            seed_weights.append(1.0 if weights is None else float(weights[i]))
+        
+        if not seeds:
+            return jsonify({"error": "None of the movie ids were found", "unknown_ids": unknown_ids}), 404
+        if sum(seed_weights) == 0:
+            return jsonify({"error": "At least one weight must be positive"}), 400
+        
+        # One profile vector scored in a single pass, with the seeds masked out
+        if allowed is None:
+            allowed = np.ones(len(models.card_store), dtype=bool)
+        allowed[seeds] = False
+        profile = models.knn_engine.profile(seeds, seed_weights)
+        distances, indices = models.knn_engine.query(profile, k, allowed=allowed)
+        
+        recommendations = models.card_store.cards(indices)
+        for recommendation, similarity_score in zip(recommendations, 1 - distances):
+            recommendation["similarity_score"] = similarity_score
+        
+        return jsonify({
+            "seeds": [{"id": int(models.movie_index.ids[movie_idx]), "title": models.card_store.columns['title'][movie_idx]} for movie_idx in seeds],
+            "unknown_ids": unknown_ids,
+            "recommendations": recommendations
+        })
+        
+    except Exception as e:
+        print(f"Profile recommendation error: {e}")
+        return jsonify({"error": f"Profile recommendation failed: {str(e)}"}), 500
+
 @app.route('/api/popular', methods=['GET'])
 def get_popular_movies():
     """Get popular movies for better recommendations"""
-    if movies_df is None:
+    models = g.models
+    if models.movies_df is None:
         return jsonify({"movies": []})
     
     try:
         # Get movies with good titles and preferably with posters
-        popular_movies = movies_df.head(500)
-        popular_movies = popular_movies[popular_movies['original_title'].notna()]
+        popular_positions = np.flatnonzero(models.card_store.has_title[:500])
         
         # Prioritize movies with poster paths
-        movies_with_posters = popular_movies[popular_movies['poster_path'].notna()]
+        movies_with_posters = popular_positions[models.card_store.has_poster[popular_positions]]
         
         if len(movies_with_posters) >= 6:
-            sampled = movies_with_posters.sample(n=6)
+            sampled = np.random.choice(movies_with_posters, 6, replace=False)
         else:
             # If not enough movies with posters, mix with others
-            sample_size = min(6, len(popular_movies))
-            sampled = popular_movies.sample(n=sample_size)
-        
-        movies_list = []
-        for idx, row in sampled.iterrows():
-            # Handle NaN values properly
-            overview = row['overview'] if pd.notna(row['overview']) else "No overview available"
-            title = row['original_title'] if pd.notna(row['original_title']) else "Unknown Title"
-            
-            # Truncate overview if too long
-            if len(str(overview)) > 200:
-                overview = str(overview)[:200] + "..."
-            
-            # Extract year from release_date
-            year = 2000  # default
-            if pd.notna(row.get('release_date')):
-                try:
-                    year_str = str(row['release_date'])[:4]
-                    year = int(year_str) if year_str.isdigit() else 2000
-                except:
-                    year = 2000
-            
-            # Get poster URL with fallback
-            movie_genres = get_movie_genres(row)
-            poster_url = get_poster_url(row, str(title), movie_genres)
-            
-            # Safely convert ID to integer
-            try:
-                movie_id_val = int(float(str(row.get('id', idx))))
-            except (ValueError, TypeError):
-                movie_id_val = idx
-                
-            movies_list.append({
-                "id": movie_id_val,
-                "title": str(title),
-                "overview": str(overview),
-                "year": year,
-                "genre": movie_genres[0] if movie_genres else "drama",
-                "img": poster_url
-            })
+            sample_size = min(6, len(popular_positions))
+            sampled = np.random.choice(popular_positions, sample_size, replace=False)
+        
+        movies_list = models.card_store.cards(sampled)
         
         return jsonify({"movies": movies_list})
         
@@ -517,7 +555,8 @@ def get_popular_movies():
 @app.route('/api/recommend/random', methods=['GET'])
 def recommend_random():
     """Get recommendations for a random movie"""
-    if movies_df is None or knn_model is None:
+    models = g.models
+    if models.movies_df is None or models.knn_model is None:
         # Return mock recommendations
         return jsonify({
             "movie": {"id": 1, "title": "The Shawshank Redemption"},
@@ -530,14 +569,33 @@ def recommend_random():
     
     try:
         # Pick a random popular movie (from first 1000 to get better known movies)
-        random_idx = np.random.randint(0, min(1000, len(movies_df)))
-        movie_row = movies_df.iloc[random_idx]
-        movie_id = int(movie_row.get('id', random_idx))
+        movie_id = models.movie_index.random_id(limit=1000)
         
-        return recommend_movies(movie_id)
+        response = make_response(recommend_movies(movie_id=movie_id))
+        # A different movie every time, so this URL must never be reused from the browser cache
+        response.headers.pop('ETag', None)
+        response.headers['Cache-Control'] = 'no-store'
+        return response
     except Exception as e:
         print(f"Error in random recommendations: {e}")
         return jsonify({"error": f"Random recommendation failed: {str(e)}"}), 500
 
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """Response cache size and hit/miss/eviction counters"""
+    shared_stats = response_cache.shared.stats() if response_cache.shared is not None else None
+    return jsonify({"response_cache": response_cache.stats(), "shared_cache": shared_stats})
+
+@app.route('/api/reload', methods=['POST'])
+def reload():
+    """Reload models and data from disk and invalidate the caches (ENABLE_RELOAD=1, localhost only)"""
+    if not ENABLE_RELOAD:
+        return jsonify({"error": "Reloading is disabled; start the server with ENABLE_RELOAD=1"}), 404
+    if request.remote_addr not in LOCAL_ADDRESSES:
+        return jsonify({"error": "Reloading is only allowed from localhost"}), 403
+    if not reload_models():
+        return jsonify({"error": "Models could not be reloaded; still serving the previous models"}), 500
+    return jsonify({"message": "Models reloaded", "movies": len(current_models.card_store), "version": current_models.version})
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
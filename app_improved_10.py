@@ -4,6 +4,14 @@ import pandas as pd
 import numpy as np
 import joblib
 import os
+from movie_index import MovieIdIndex
+from title_search import TitleSearchIndex
+from catalog_snapshot import load_catalog
+from card_store import DETAIL_FIELDS, MovieCardStore
+from feature_store import GENRE_COLUMNS, build_feature_matrix, load_feature_matrix, save_feature_matrix
+from neighbor_table import load_neighbor_table
+from knn_engine import KNNEngine, exclude_position
+from filter_index import MovieFilterIndex
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for frontend communication
@@ -24,65 +32,56 @@ def load_models():
         scaler = joblib.load('improved_scaler_10.joblib')
         print("✅ Improved scaler loaded")
         
-        print("Loading movie data...")
-        movies_df = pd.read_csv('movies_preprocessed.csv', low_memory=False)
-        
-        # Load original metadata for poster paths
-        print("Loading poster data...")
-        original_df = pd.read_csv('movies_metadata.csv', low_memory=False)
-        # Merge poster paths
-        movies_df = movies_df.merge(original_df[['id', 'poster_path', 'release_date']], on='id', how='left', suffixes=('', '_orig'))
-        
+        # One typed, columnar snapshot instead of parsing and merging both CSVs
+        movies_df = load_catalog()
         print(f"✅ Loaded {len(movies_df)} movies with poster data")
         
-        # Preprocess the data (same as in improved_model.py)
-        movies_df['adult'] = movies_df['adult'].map({'True': 1, 'False': 0, True: 1, False: 0})
-        text_data = movies_df['overview'].fillna('') + ' ' + movies_df['original_title'].fillna('')
-        
-        # Improved TF-IDF with same parameters as training
-        text_features = tfidf_vectorizer.transform(text_data).toarray()
-        
-        # Extract genre features
-        genre_columns = ['Action', 'Adventure', 'Animation', 'Comedy', 'Crime', 'Documentary', 
-                        'Drama', 'Family', 'Fantasy', 'Horror', 'Music', 'Mystery', 
-                        'Romance', 'Science Fiction', 'Thriller', 'War', 'Western']
-        available_genres = [col for col in genre_columns if col in movies_df.columns]
-        genre_features = movies_df[available_genres].fillna(0).values
+        # Build the id -> row position index once instead of scanning per request
+        movie_index = MovieIdIndex(movies_df)
+        print(f"✅ Indexed {len(movie_index)} movie ids ({movie_index.malformed_count} malformed, {movie_index.duplicate_count} duplicates skipped)")
         
-        # Extract language features
-        language_columns = [col for col in movies_df.columns if col in ['en', 'fr', 'es', 'de', 'it', 'ja', 'ko', 'zh']]
-        language_features = movies_df[language_columns].fillna(0).values if language_columns else np.zeros((len(movies_df), 1))
-        
-        # Extract and scale numerical features
-        numerical_features = movies_df[['budget_norm', 'adult']].fillna(0).values
-        numerical_features_scaled = scaler.transform(numerical_features)
+        # Reuse the feature matrix saved by retrain_improved_model_10.py while it matches the models and movie rows
+        X, feature_manifest = load_feature_matrix('improved_features_10', movie_index.ids, 'improved_tfidf_vectorizer_10.joblib', 'improved_scaler_10.joblib')
+        if X is not None:
+            print(f"✅ Memory-mapped feature matrix {X.shape} from {feature_manifest['matrix_file']}")
+        else:
+            print("Building feature matrix...")
+            X, feature_blocks = build_feature_matrix(movies_df, tfidf_vectorizer, scaler)
+            try:
+                feature_manifest = save_feature_matrix('improved_features_10', X, movie_index.ids, feature_blocks, 'improved_tfidf_vectorizer_10.joblib', 'improved_scaler_10.joblib')
+                print(f"✅ Feature matrix {X.shape} saved for the next start")
+            except OSError as e:
+                print(f"Could not save feature matrix: {e}")
+        
+        # Precomputed top-50 neighbors from neighbor_table.py; movies outside it use the on-line kNN
+        neighbor_table = load_neighbor_table('improved_features_10', movie_index.ids, feature_manifest, knn_model.n_neighbors - 1)
+        if neighbor_table is not None:
+            print(f"✅ Memory-mapped neighbor table for {len(neighbor_table)} movies")
+        else:
+            print("No neighbor table, recommendations use the on-line kNN (run: python neighbor_table.py)")
         
-        # Apply same weights as in training
-        text_weight = 1.0
-        genre_weight = 3.0
-        language_weight = 0.5
-        numerical_weight = 0.5
+        # Pre-normalized float32 copy of X answers kneighbors with one mat-vec per request
+        knn_engine = KNNEngine.from_model(knn_model, X)
+        print(f"✅ kNN engine ready ({knn_engine.metric}, {knn_engine.n_neighbors} neighbors)")
         
-        weighted_text = text_features * text_weight
-        weighted_genres = genre_features * genre_weight
-        weighted_languages = language_features * language_weight
-        weighted_numerical = numerical_features_scaled * numerical_weight
+        # Card fields (overview, year, genres, poster URL) are computed once for every movie
+        card_store = MovieCardStore(movies_df, GENRE_COLUMNS, movie_index.ids,
+                                    poster_fn=lambda position, poster_path, title, genres, year: get_poster_url({'poster_path': poster_path}, title),
+                                    primary_genres=False)
+        print(f"✅ Built {len(card_store)} movie cards")
         
-        # Combine all features
-        X = np.hstack([
-            weighted_text,
-            weighted_genres, 
-            weighted_languages,
-            weighted_numerical
-        ])
+        # Accent-folded n-gram index over original and localized titles, so searches never scan the DataFrame
+        title_index = TitleSearchIndex([movies_df['original_title'], movies_df['title']])
+        # Genre/language/adult bitsets and a sorted year array for recommendation constraints
+        filter_index = MovieFilterIndex(movies_df)
         
         print("✅ Improved models with 10 recommendations loaded successfully!")
-        return knn_model, tfidf_vectorizer, movies_df, X, scaler
+        return knn_model, tfidf_vectorizer, movies_df, X, scaler, movie_index, card_store, neighbor_table, knn_engine, title_index, filter_index
         
     except Exception as e:
         print(f"❌ Error loading improved models: {e}")
         print("💡 Try running: python retrain_improved_model_10.py")
-        return None, None, None, None, None
+        return None, None, None, None, None, None, None, None, None, None, None
 
 # Helper function to get poster URL with fallbacks
 def get_poster_url(row, title):
@@ -100,19 +99,8 @@ def get_poster_url(row, title):
     # Final fallback
     return "https://via.placeholder.com/300x450/1a1a2e/ffffff?text=No+Poster"
 
-def filter_movies_with_posters(movies_df, limit=50):
-    """Filter movies that have poster paths for better user experience"""
-    # First try to get movies with poster paths
-    movies_with_posters = movies_df[movies_df['poster_path'].notna()]
-    
-    if len(movies_with_posters) >= limit:
-        return movies_with_posters.head(limit)
-    else:
-        # If not enough movies with posters, include some without
-        return movies_df.head(limit)
-
 # Load models
-knn_model, tfidf_vectorizer, movies_df, X, scaler = load_models()
+knn_model, tfidf_vectorizer, movies_df, X, scaler, movie_index, card_store, neighbor_table, knn_engine, title_index, filter_index = load_models()
 
 @app.route('/')
 def home():
@@ -129,45 +117,7 @@ def get_movies():
         return jsonify({"movies": []})
     
     # Return movies with posters prioritized
-    filtered_movies = filter_movies_with_posters(movies_df, 50)
-    movies_list = []
-    for idx, row in filtered_movies.iterrows():
-        # Handle NaN values properly
-        overview = row['overview'] if pd.notna(row['overview']) else "No overview available"
-        title = row['original_title'] if pd.notna(row['original_title']) else "Unknown Title"
-        
-        # Truncate overview if too long
-        if len(str(overview)) > 200:
-            overview = str(overview)[:200] + "..."
-        
-        # Extract year from release_date
-        year = 2000  # default
-        if pd.notna(row.get('release_date')):
-            try:
-                year_str = str(row['release_date'])[:4]
-                year = int(year_str) if year_str.isdigit() else 2000
-            except:
-                year = 2000
-        
-        # Get poster URL with fallback
-        poster_url = get_poster_url(row, str(title))
-        
-        # Safely convert ID to integer
-        try:
-            movie_id_val = int(float(str(row.get('id', idx))))
-        except (ValueError, TypeError):
-            movie_id_val = idx
-            
-        movies_list.append({
-            "id": movie_id_val,
-            "title": str(title),
-            "overview": str(overview),
-            "year": year,
-            "genre": "drama",  # Default genre since we don't have genre data
-            "img": poster_url
-        })
-    
-    return jsonify({"movies": movies_list})
+    return jsonify({"movies": card_store.cards(card_store.poster_first(50))})
 
 @app.route('/api/search', methods=['GET'])
 def search_movies():
@@ -180,47 +130,15 @@ def search_movies():
     if not query:
         return jsonify({"movies": []})
     
-    # Filter movies by title
-    filtered_movies = movies_df[movies_df['original_title'].str.lower().str.contains(query, na=False)]
-    
-    movies_list = []
-    for idx, row in filtered_movies.head(20).iterrows():
-        # Handle NaN values properly
-        overview = row['overview'] if pd.notna(row['overview']) else "No overview available"
-        title = row['original_title'] if pd.notna(row['original_title']) else "Unknown Title"
-        
-        # Truncate overview if too long
-        if len(str(overview)) > 200:
-            overview = str(overview)[:200] + "..."
-        
-        # Extract year from release_date
-        year = 2000  # default
-        if pd.notna(row.get('release_date')):
-            try:
-                year_str = str(row['release_date'])[:4]
-                year = int(year_str) if year_str.isdigit() else 2000
-            except:
-                year = 2000
-        
-        # Get poster URL with fallback
-        poster_url = get_poster_url(row, str(title))
-        
-        # Safely convert ID to integer
-        try:
-            movie_id_val = int(float(str(row.get('id', idx))))
-        except (ValueError, TypeError):
-            movie_id_val = idx
-            
-        movies_list.append({
-            "id": movie_id_val,
-            "title": str(title),
-            "overview": str(overview),
-            "year": year,
-            "genre": "drama",
-            "img": poster_url
-        })
+    try:
+        # Filters are applied before the 20-result cut
+        allowed = filter_index.parse_mask(request.args)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid filter: {str(e)}"}), 400
     
-    return jsonify({"movies": movies_list})
+    # Literal substring match on the title index (exact and prefix matches first)
+    positions = title_index.search(query, limit=20, allowed=allowed)
+    return jsonify({"movies": card_store.cards(positions)})
 
 @app.route('/api/movie/<int:movie_id>', methods=['GET'])
 def get_movie_details(movie_id):
@@ -229,59 +147,13 @@ def get_movie_details(movie_id):
         return jsonify({"error": "Movies data not loaded"}), 500
     
     try:
-        # Find movie by ID
-        movie_row = None
-        for idx, row in movies_df.iterrows():
-            try:
-                row_id = int(float(str(row.get('id', idx))))
-                if row_id == movie_id:
-                    movie_row = row
-                    break
-            except (ValueError, TypeError):
-                continue
+        # Find movie index by ID
+        movie_idx = movie_index.position(movie_id)
         
-        if movie_row is None:
+        if movie_idx is None:
             return jsonify({"error": f"Movie with ID {movie_id} not found"}), 404
         
-        # Handle NaN values properly
-        overview = movie_row['overview'] if pd.notna(movie_row['overview']) else "No overview available"
-        title = movie_row['original_title'] if pd.notna(movie_row['original_title']) else "Unknown Title"
-        
-        # Extract year from release_date
-        year = 2000  # default
-        if pd.notna(movie_row.get('release_date')):
-            try:
-                year_str = str(movie_row['release_date'])[:4]
-                year = int(year_str) if year_str.isdigit() else 2000
-            except:
-                year = 2000
-        
-        # Get genres for this movie
-        genre_columns = ['Action', 'Adventure', 'Animation', 'Comedy', 'Crime', 'Documentary', 
-                        'Drama', 'Family', 'Fantasy', 'Horror', 'Music', 'Mystery', 
-                        'Romance', 'Science Fiction', 'Thriller', 'War', 'Western']
-        available_genres = [col for col in genre_columns if col in movies_df.columns]
-        movie_genres = [genre for genre in available_genres if movie_row[genre] == 1]
-        
-        # Get poster URL with fallback
-        poster_url = get_poster_url(movie_row, str(title))
-        
-        # Safely convert ID to integer
-        try:
-            movie_id_val = int(float(str(movie_row.get('id', movie_id))))
-        except (ValueError, TypeError):
-            movie_id_val = movie_id
-        
-        movie_details = {
-            "id": movie_id_val,
-            "title": str(title),
-            "overview": str(overview),
-            "year": year,
-            "genres": movie_genres,
-            "img": poster_url,
-            "budget": float(movie_row.get('budget_norm', 0)) if pd.notna(movie_row.get('budget_norm')) else 0,
-            "adult": bool(movie_row.get('adult', False))
-        }
+        movie_details = card_store.card(movie_idx, DETAIL_FIELDS)
         
         return jsonify({"movie": movie_details})
         
@@ -295,77 +167,50 @@ def recommend_movies(movie_id):
     if knn_model is None or movies_df is None or X is None:
         return jsonify({"error": "Models not loaded"}), 500
     
+    try:
+        # Optional genre/year/language/adult constraints, applied inside the neighbor search
+        allowed = filter_index.parse_mask(request.args)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid filter: {str(e)}"}), 400
+    
     try:
         # Find movie index by ID
-        movie_idx = None
-        movie_row = None
-        for idx, row in movies_df.iterrows():
-            try:
-                row_id = int(float(str(row.get('id', idx))))
-                if row_id == movie_id:
-                    movie_idx = idx
-                    movie_row = row
-                    break
-            except (ValueError, TypeError):
-                # If ID conversion fails, skip this row
-                continue
+        movie_idx = movie_index.position(movie_id)
         
         if movie_idx is None:
             return jsonify({"error": f"Movie with ID {movie_id} not found"}), 404
         
-        print(f"Finding 10 recommendations for: {movie_row['original_title']}")
-        
-        # Get 10 recommendations using improved model
-        distances, indices = knn_model.kneighbors([X[movie_idx]])
-        recommended_indices = indices[0][1:]  # Exclude the movie itself (now 10 recommendations)
-        
-        # Convert cosine distances to similarity scores (cosine distance = 1 - cosine similarity)
-        similarities = 1 - distances[0][1:]
-        
-        recommendations = []
-        for i, idx in enumerate(recommended_indices):
-            row = movies_df.iloc[idx]
-            
-            # Handle NaN values properly
-            overview = row['overview'] if pd.notna(row['overview']) else "No overview available"
-            title = row['original_title'] if pd.notna(row['original_title']) else "Unknown Title"
-            
-            # Truncate overview if too long
-            if len(str(overview)) > 200:
-                overview = str(overview)[:200] + "..."
-            
-            # Extract year from release_date
-            year = 2000  # default
-            if pd.notna(row.get('release_date')):
-                try:
-                    year_str = str(row['release_date'])[:4]
-                    year = int(year_str) if year_str.isdigit() else 2000
-                except:
-                    year = 2000
-            
-            # Use improved similarity score from cosine similarity
-            similarity_score = float(similarities[i])
-            
-            # Get poster URL with fallback
-            poster_url = get_poster_url(row, str(title))
-            
-            # Safely convert ID to integer
-            try:
-                movie_id_val = int(float(str(row.get('id', idx))))
-            except (ValueError, TypeError):
-                movie_id_val = idx
+        selected_movie_title = card_store.columns['title'][movie_idx]
+        
+        print(f"Finding 10 recommendations for: {selected_movie_title}")
+        
+        n_recommendations = knn_model.n_neighbors - 1
+        # Look up the precomputed neighbors when the movie is in the neighbor table; unfiltered
+        # requests take the first 10 of the row
+        neighbors = neighbor_table.lookup(movie_idx) if neighbor_table is not None else None
+        if neighbors is not None and allowed is not None:
+            # Filtered: the whole (deeper) row is over-fetched; only a row with too few valid
+            # neighbors falls back to a masked search
+            keep = allowed[neighbors[0]]
+            neighbors = (neighbors[0][keep], neighbors[1][keep]) if keep.sum() >= n_recommendations else None
+        if neighbors is not None:
+            recommended_indices, similarities = neighbors[0][:n_recommendations], neighbors[1][:n_recommendations]
+        elif allowed is not None:
+            distances, indices = knn_engine.kneighbors(movie_idx, n_recommendations + 1, allowed=allowed)
+            distances, recommended_indices = exclude_position(distances, indices, movie_idx, n_recommendations)
+            similarities = 1 - distances
+        else:
+            # Get 10 recommendations using improved model (same ranking as knn_model.kneighbors)
+            distances, indices = knn_engine.kneighbors(movie_idx)
+            recommended_indices = indices[1:]  # Exclude the movie itself (now 10 recommendations)
             
-            recommendations.append({
-                "id": movie_id_val,
-                "title": str(title),
-                "overview": str(overview),
-                "year": year,
-                "genre": "drama",
-                "similarity_score": similarity_score,
-                "img": poster_url
-            })
+            # Convert cosine distances to similarity scores (cosine distance = 1 - cosine similarity)
+            similarities = 1 - distances[1:]
         
-        selected_movie_title = str(movie_row['original_title']) if pd.notna(movie_row['original_title']) else "Unknown Title"
+        recommendations = card_store.cards(recommended_indices)
+        for recommendation, similarity_score in zip(recommendations, similarities):
+            # Use improved similarity score from cosine similarity
+            recommendation["similarity_score"] = float(similarity_score)
         
         print(f"✅ Found 10 recommendations for {selected_movie_title}")
         
@@ -389,55 +234,19 @@ def get_popular_movies():
     
     try:
         # Get movies with good titles and preferably with posters
-        popular_movies = movies_df.head(500)
-        popular_movies = popular_movies[popular_movies['original_title'].notna()]
+        popular_positions = np.flatnonzero(card_store.has_title[:500])
         
         # Prioritize movies with poster paths
-        movies_with_posters = popular_movies[popular_movies['poster_path'].notna()]
+        movies_with_posters = popular_positions[card_store.has_poster[popular_positions]]
         
         if len(movies_with_posters) >= 6:
-            sampled = movies_with_posters.sample(n=6)
+            sampled = np.random.choice(movies_with_posters, 6, replace=False)
         else:
             # If not enough movies with posters, mix with others
-            sample_size = min(6, len(popular_movies))
-            sampled = popular_movies.sample(n=sample_size)
+            sample_size = min(6, len(popular_positions))
+            sampled = np.random.choice(popular_positions, sample_size, replace=False)
         
-        movies_list = []
-        for idx, row in sampled.iterrows():
-            # Handle NaN values properly
-            overview = row['overview'] if pd.notna(row['overview']) else "No overview available"
-            title = row['original_title'] if pd.notna(row['original_title']) else "Unknown Title"
-            
-            # Truncate overview if too long
-            if len(str(overview)) > 200:
-                overview = str(overview)[:200] + "..."
-            
-            # Extract year from release_date
-            year = 2000  # default
-            if pd.notna(row.get('release_date')):
-                try:
-                    year_str = str(row['release_date'])[:4]
-                    year = int(year_str) if year_str.isdigit() else 2000
-                except:
-                    year = 2000
-            
-            # Get poster URL with fallback
-            poster_url = get_poster_url(row, str(title))
-            
-            # Safely convert ID to integer
-            try:
-                movie_id_val = int(float(str(row.get('id', idx))))
-            except (ValueError, TypeError):
-                movie_id_val = idx
-                
-            movies_list.append({
-                "id": movie_id_val,
-                "title": str(title),
-                "overview": str(overview),
-                "year": year,
-                "genre": "drama",
-                "img": poster_url
-            })
+        movies_list = card_store.cards(sampled)
         
         return jsonify({"movies": movies_list})
         
@@ -453,9 +262,7 @@ def recommend_random():
     
     try:
         # Pick a random popular movie (from first 1000 to get better known movies)
-        random_idx = np.random.randint(0, min(1000, len(movies_df)))
-        movie_row = movies_df.iloc[random_idx]
-        movie_id = int(movie_row.get('id', random_idx))
+        movie_id = movie_index.random_id(limit=1000)
         
         return recommend_movies(movie_id)
     except Exception as e:
@@ -4,6 +4,12 @@ import pandas as pd
 import numpy as np
 import joblib
 import os
+from movie_index import MovieIdIndex
+from title_search import TitleSearchIndex
+from catalog_snapshot import SERVING_ONLY_COLUMNS, load_catalog
+from card_store import MovieCardStore
+from knn_engine import KNNEngine
+from filter_index import MovieFilterIndex
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for frontend communication
@@ -20,35 +26,47 @@ def load_models():
         tfidf_vectorizer = joblib.load('tfidf_vectorizer.joblib')
         print("✅ TF-IDF vectorizer loaded")
         
-        print("Loading movie data...")
-        movies_df = pd.read_csv('movies_preprocessed.csv', low_memory=False)
-        
-        # Load original metadata for poster paths
-        print("Loading poster data...")
-        original_df = pd.read_csv('movies_metadata.csv', low_memory=False)
-        # Merge poster paths
-        movies_df = movies_df.merge(original_df[['id', 'poster_path', 'release_date']], on='id', how='left', suffixes=('', '_orig'))
-        
+        # One typed, columnar snapshot instead of parsing and merging both CSVs
+        movies_df = load_catalog()
         print(f"✅ Loaded {len(movies_df)} movies with poster data")
         
-        # Preprocess the data (same as in model.py)
-        movies_df['adult'] = movies_df['adult'].map({'True': 1, 'False': 0, True: 1, False: 0})
         text_data = movies_df['overview'].fillna('') + ' ' + movies_df['original_title'].fillna('')
         text_features = tfidf_vectorizer.transform(text_data).toarray()
         
-        non_text_features = movies_df.drop(columns=['id', 'original_title', 'overview'])
+        non_text_features = movies_df.drop(columns=['id', 'original_title', 'overview'] + SERVING_ONLY_COLUMNS)
         non_text_features = non_text_features.select_dtypes(include=[np.number])
         non_text_features = non_text_features.fillna(0)
         
         X = np.hstack([text_features, non_text_features.values])
         
+        # Build the id -> row position index once instead of scanning per request
+        movie_index = MovieIdIndex(movies_df)
+        print(f"✅ Indexed {len(movie_index)} movie ids ({movie_index.malformed_count} malformed, {movie_index.duplicate_count} duplicates skipped)")
+        
+        # float32 copy of X answers the euclidean kneighbors with one mat-vec per request
+        knn_engine = KNNEngine.from_model(knn_model, X)
+        print(f"✅ kNN engine ready ({knn_engine.metric}, {knn_engine.n_neighbors} neighbors)")
+        
+        # Card fields (overview, year, poster URL) are computed once for every movie;
+        # this app has no genre data in its cards, so no genre columns are passed
+        card_store = MovieCardStore(movies_df, [], movie_index.ids,
+                                    poster_fn=lambda position, poster_path, title, genres, year: get_poster_url({'poster_path': poster_path}, title))
+        print(f"✅ Built {len(card_store)} movie cards")
+        
+        # Accent-folded n-gram index over original and localized titles, so searches never scan the DataFrame
+        title_index = TitleSearchIndex([movies_df['original_title'], movies_df['title']])
+        
+        # Packed genre/language/adult bitsets and a sorted year array for the search filters
+        filter_index = MovieFilterIndex(movies_df)
+        print(f"✅ Filter index ready ({len(filter_index.genre_bits)} genres, {len(filter_index.language_bits)} languages)")
+        
         print("✅ Models and data loaded successfully!")
-        return knn_model, tfidf_vectorizer, movies_df, X
+        return knn_model, tfidf_vectorizer, movies_df, X, movie_index, card_store, knn_engine, title_index, filter_index
         
     except Exception as e:
         print(f"❌ Error loading models: {e}")
         print("💡 Try running: python retrain_models.py")
-        return None, None, None, None
+        return None, None, None, None, None, None, None, None, None
 
 # Helper function to get poster URL with fallbacks
 def get_poster_url(row, title):
@@ -72,19 +90,8 @@ def get_poster_url(row, title):
     # Final fallback
     return "https://via.placeholder.com/300x450/1a1a2e/ffffff?text=No+Poster"
 
-def filter_movies_with_posters(movies_df, limit=50):
-    """Filter movies that have poster paths for better user experience"""
-    # First try to get movies with poster paths
-    movies_with_posters = movies_df[movies_df['poster_path'].notna()]
-    
-    if len(movies_with_posters) >= limit:
-        return movies_with_posters.head(limit)
-    else:
-        # If not enough movies with posters, include some without
-        return movies_df.head(limit)
-
 # Load models
-knn_model, tfidf_vectorizer, movies_df, X = load_models()
+knn_model, tfidf_vectorizer, movies_df, X, movie_index, card_store, knn_engine, title_index, filter_index = load_models()
 
 @app.route('/')
 def home():
@@ -110,39 +117,7 @@ def get_movies():
         })
     
     # Return movies with posters prioritized
-    filtered_movies = filter_movies_with_posters(movies_df, 50)
-    movies_list = []
-    for idx, row in filtered_movies.iterrows():
-        # Handle NaN values properly
-        overview = row['overview'] if pd.notna(row['overview']) else "No overview available"
-        title = row['original_title'] if pd.notna(row['original_title']) else "Unknown Title"
-        
-        # Truncate overview if too long
-        if len(str(overview)) > 200:
-            overview = str(overview)[:200] + "..."
-        
-        # Extract year from release_date
-        year = 2000  # default
-        if pd.notna(row.get('release_date')):
-            try:
-                year_str = str(row['release_date'])[:4]
-                year = int(year_str) if year_str.isdigit() else 2000
-            except:
-                year = 2000
-        
-        # Get poster URL with fallback
-        poster_url = get_poster_url(row, str(title))
-        
-        movies_list.append({
-            "id": int(row.get('id', idx)),
-            "title": str(title),
-            "overview": str(overview),
-            "year": year,
-            "genre": "drama",  # Default genre since we don't have genre data
-            "img": poster_url
-        })
-    
-    return jsonify({"movies": movies_list})
+    return jsonify({"movies": card_store.cards(card_store.poster_first(50))})
 
 @app.route('/api/search', methods=['GET'])
 def search_movies():
@@ -162,41 +137,15 @@ def search_movies():
     if not query:
         return jsonify({"movies": []})
     
-    # Filter movies by title
-    filtered_movies = movies_df[movies_df['original_title'].str.lower().str.contains(query, na=False)]
-    
-    movies_list = []
-    for idx, row in filtered_movies.head(20).iterrows():
-        # Handle NaN values properly
-        overview = row['overview'] if pd.notna(row['overview']) else "No overview available"
-        title = row['original_title'] if pd.notna(row['original_title']) else "Unknown Title"
-        
-        # Truncate overview if too long
-        if len(str(overview)) > 200:
-            overview = str(overview)[:200] + "..."
-        
-        # Extract year from release_date
-        year = 2000  # default
-        if pd.notna(row.get('release_date')):
-            try:
-                year_str = str(row['release_date'])[:4]
-                year = int(year_str) if year_str.isdigit() else 2000
-            except:
-                year = 2000
-        
-        # Get poster URL with fallback
-        poster_url = get_poster_url(row, str(title))
-        
-        movies_list.append({
-            "id": int(row.get('id', idx)),
-            "title": str(title),
-            "overview": str(overview),
-            "year": year,
-            "genre": "drama",
-            "img": poster_url
-        })
+    try:
+        # Filters are applied before the 20-result cut
+        allowed = filter_index.parse_mask(request.args)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid filter: {str(e)}"}), 400
     
-    return jsonify({"movies": movies_list})
+    # Literal substring match on the title index (exact and prefix matches first)
+    positions = title_index.search(query, limit=20, allowed=allowed)
+    return jsonify({"movies": card_store.cards(positions)})
 
 @app.route('/api/recommend/<int:movie_id>', methods=['GET'])
 def recommend_movies(movie_id):
@@ -206,63 +155,23 @@ def recommend_movies(movie_id):
     
     try:
         # Find movie index by ID
-        movie_idx = None
-        movie_row = None
-        for idx, row in movies_df.iterrows():
-            if int(row.get('id', idx)) == movie_id:
-                movie_idx = idx
-                movie_row = row
-                break
+        movie_idx = movie_index.position(movie_id)
         
         if movie_idx is None:
             return jsonify({"error": f"Movie with ID {movie_id} not found"}), 404
         
-        print(f"Finding recommendations for: {movie_row['original_title']}")
+        selected_movie_title = card_store.columns['title'][movie_idx]
         
-        # Get recommendations
-        distances, indices = knn_model.kneighbors([X[movie_idx]])
-        recommended_indices = indices[0][1:]  # Exclude the movie itself
+        print(f"Finding recommendations for: {selected_movie_title}")
         
-        recommendations = []
-        for i, idx in enumerate(recommended_indices):
-            row = movies_df.iloc[idx]
-            
-            # Handle NaN values properly
-            overview = row['overview'] if pd.notna(row['overview']) else "No overview available"
-            title = row['original_title'] if pd.notna(row['original_title']) else "Unknown Title"
-            
-            # Truncate overview if too long
-            if len(str(overview)) > 200:
-                overview = str(overview)[:200] + "..."
-            
-            # Extract year from release_date
-            year = 2000  # default
-            if pd.notna(row.get('release_date')):
-                try:
-                    year_str = str(row['release_date'])[:4]
-                    year = int(year_str) if year_str.isdigit() else 2000
-                except:
-                    year = 2000
-            
-            # Calculate similarity score (convert distance to similarity percentage)
-            distance = distances[0][i + 1]  # +1 because we excluded the original movie
-            # Use exponential decay for better similarity scores
-            similarity_score = float(np.exp(-distance / 10))  # Scale distance for better range
-            
-            # Get poster URL with fallback
-            poster_url = get_poster_url(row, str(title))
-            
-            recommendations.append({
-                "id": int(row.get('id', idx)),
-                "title": str(title),
-                "overview": str(overview),
-                "year": year,
-                "genre": "drama",
-                "similarity_score": similarity_score,
-                "img": poster_url
-            })
+        # Get recommendations (same ranking as knn_model.kneighbors)
+        distances, indices = knn_engine.kneighbors(movie_idx)
+        recommended_indices = indices[1:]  # Exclude the movie itself
         
-        selected_movie_title = str(movie_row['original_title']) if pd.notna(movie_row['original_title']) else "Unknown Title"
+        recommendations = card_store.cards(recommended_indices)
+        for recommendation, distance in zip(recommendations, distances[1:]):
+            # Use exponential decay for better similarity scores
+            recommendation["similarity_score"] = float(np.exp(-distance / 10))  # Scale distance for better range
         
         return jsonify({
             "movie": {
@@ -284,49 +193,19 @@ def get_popular_movies():
     
     try:
         # Get movies with good titles and preferably with posters
-        popular_movies = movies_df.head(500)
-        popular_movies = popular_movies[popular_movies['original_title'].notna()]
+        popular_positions = np.flatnonzero(card_store.has_title[:500])
         
         # Prioritize movies with poster paths
-        movies_with_posters = popular_movies[popular_movies['poster_path'].notna()]
+        movies_with_posters = popular_positions[card_store.has_poster[popular_positions]]
         
         if len(movies_with_posters) >= 6:
-            sampled = movies_with_posters.sample(n=6)
+            sampled = np.random.choice(movies_with_posters, 6, replace=False)
         else:
             # If not enough movies with posters, mix with others
-            sample_size = min(6, len(popular_movies))
-            sampled = popular_movies.sample(n=sample_size)
+            sample_size = min(6, len(popular_positions))
+            sampled = np.random.choice(popular_positions, sample_size, replace=False)
         
-        movies_list = []
-        for idx, row in sampled.iterrows():
-            # Handle NaN values properly
-            overview = row['overview'] if pd.notna(row['overview']) else "No overview available"
-            title = row['original_title'] if pd.notna(row['original_title']) else "Unknown Title"
-            
-            # Truncate overview if too long
-            if len(str(overview)) > 200:
-                overview = str(overview)[:200] + "..."
-            
-            # Extract year from release_date
-            year = 2000  # default
-            if pd.notna(row.get('release_date')):
-                try:
-                    year_str = str(row['release_date'])[:4]
-                    year = int(year_str) if year_str.isdigit() else 2000
-                except:
-                    year = 2000
-            
-            # Get poster URL with fallback
-            poster_url = get_poster_url(row, str(title))
-            
-            movies_list.append({
-                "id": int(row.get('id', idx)),
-                "title": str(title),
-                "overview": str(overview),
-                "year": year,
-                "genre": "drama",
-                "img": poster_url
-            })
+        movies_list = card_store.cards(sampled)
         
         return jsonify({"movies": movies_list})
         
@@ -350,9 +229,7 @@ def recommend_random():
     
     try:
         # Pick a random popular movie (from first 1000 to get better known movies)
-        random_idx = np.random.randint(0, min(1000, len(movies_df)))
-        movie_row = movies_df.iloc[random_idx]
-        movie_id = int(movie_row.get('id', random_idx))
+        movie_id = movie_index.random_id(limit=1000)
         
         return recommend_movies(movie_id)
     except Exception as e:
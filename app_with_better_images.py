@@ -1,10 +1,17 @@
 from flask import Flask, request, jsonify, render_template
 from flask_cors import CORS
-import pandas as pd
 import numpy as np
 import joblib
 import os
+from types import SimpleNamespace
+from movie_index import MovieIdIndex
+from title_search import TitleSearchIndex
+from catalog_snapshot import load_catalog
+from card_store import CARD_FIELDS, MovieCardStore
+from feature_store import GENRE_COLUMNS, build_feature_matrix, load_feature_matrix, save_feature_matrix
 from improved_image_handler import MovieImageHandler
+from knn_engine import KNNEngine
+from filter_index import MovieFilterIndex
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for frontend communication
@@ -28,121 +35,64 @@ def load_models():
         scaler = joblib.load('improved_scaler.joblib')
         print("✅ Improved scaler loaded")
         
-        print("Loading movie data...")
-        movies_df = pd.read_csv('movies_preprocessed.csv', low_memory=False)
-        
-        # Load original metadata for poster paths
-        print("Loading poster data...")
-        original_df = pd.read_csv('movies_metadata.csv', low_memory=False)
-        # Merge poster paths
-        movies_df = movies_df.merge(original_df[['id', 'poster_path', 'release_date']], on='id', how='left', suffixes=('', '_orig'))
-        
+        # One typed, columnar snapshot instead of parsing and merging both CSVs
+        movies_df = load_catalog()
         print(f"✅ Loaded {len(movies_df)} movies with poster data")
         
-        # Preprocess the data (same as in improved_model.py)
-        movies_df['adult'] = movies_df['adult'].map({'True': 1, 'False': 0, True: 1, False: 0})
-        text_data = movies_df['overview'].fillna('') + ' ' + movies_df['original_title'].fillna('')
-        
-        # Improved TF-IDF with same parameters as training
-        text_features = tfidf_vectorizer.transform(text_data).toarray()
+        available_genres = [col for col in GENRE_COLUMNS if col in movies_df.columns]
         
-        # Extract genre features
-        genre_columns = ['Action', 'Adventure', 'Animation', 'Comedy', 'Crime', 'Documentary', 
-                        'Drama', 'Family', 'Fantasy', 'Horror', 'Music', 'Mystery', 
-                        'Romance', 'Science Fiction', 'Thriller', 'War', 'Western']
-        available_genres = [col for col in genre_columns if col in movies_df.columns]
-        genre_features = movies_df[available_genres].fillna(0).values
+        # Build the id -> row position index once instead of scanning per request
+        movie_index = MovieIdIndex(movies_df)
+        print(f"✅ Indexed {len(movie_index)} movie ids ({movie_index.malformed_count} malformed, {movie_index.duplicate_count} duplicates skipped)")
         
-        # Extract language features
-        language_columns = [col for col in movies_df.columns if col in ['en', 'fr', 'es', 'de', 'it', 'ja', 'ko', 'zh']]
-        language_features = movies_df[language_columns].fillna(0).values if language_columns else np.zeros((len(movies_df), 1))
+        # Reuse the feature matrix saved by improved_model.py while it matches the models and movie rows
+        X, feature_manifest = load_feature_matrix('improved_features', movie_index.ids, 'improved_tfidf_vectorizer.joblib', 'improved_scaler.joblib')
+        if X is not None:
+            print(f"✅ Memory-mapped feature matrix {X.shape} from {feature_manifest['matrix_file']}")
+        else:
+            print("Building feature matrix...")
+            X, feature_blocks = build_feature_matrix(movies_df, tfidf_vectorizer, scaler)
+            try:
+                save_feature_matrix('improved_features', X, movie_index.ids, feature_blocks, 'improved_tfidf_vectorizer.joblib', 'improved_scaler.joblib')
+                print(f"✅ Feature matrix {X.shape} saved for the next start")
+            except OSError as e:
+                print(f"Could not save feature matrix: {e}")
         
-        # Extract and scale numerical features
-        numerical_features = movies_df[['budget_norm', 'adult']].fillna(0).values
-        numerical_features_scaled = scaler.transform(numerical_features)
+        # Pre-normalized float32 copy of X answers kneighbors with one mat-vec per request
+        knn_engine = KNNEngine.from_model(knn_model, X)
+        print(f"✅ kNN engine ready ({knn_engine.metric}, {knn_engine.n_neighbors} neighbors)")
         
-        # Apply same weights as in training
-        text_weight = 1.0
-        genre_weight = 3.0
-        language_weight = 0.5
-        numerical_weight = 0.5
+        # Card fields (overview, year, genres, enhanced poster URL) are computed once for every movie
+        card_store = MovieCardStore(movies_df, available_genres, movie_index.ids, poster_fn=get_enhanced_poster_url)
+        print(f"✅ Built {len(card_store)} movie cards")
         
-        weighted_text = text_features * text_weight
-        weighted_genres = genre_features * genre_weight
-        weighted_languages = language_features * language_weight
-        weighted_numerical = numerical_features_scaled * numerical_weight
+        # Accent-folded n-gram index over original and localized titles, so searches never scan the DataFrame
+        title_index = TitleSearchIndex([movies_df['original_title'], movies_df['title']])
         
-        # Combine all features
-        X = np.hstack([
-            weighted_text,
-            weighted_genres, 
-            weighted_languages,
-            weighted_numerical
-        ])
+        # Packed genre/language/adult bitsets and a sorted year array for the search filters
+        filter_index = MovieFilterIndex(movies_df)
+        print(f"✅ Filter index ready ({len(filter_index.genre_bits)} genres, {len(filter_index.language_bits)} languages)")
         
         print("✅ Improved models and data loaded successfully!")
-        return knn_model, tfidf_vectorizer, movies_df, X, scaler, available_genres
+        return knn_model, tfidf_vectorizer, movies_df, X, scaler, available_genres, movie_index, card_store, knn_engine, title_index, filter_index
         
     except Exception as e:
         print(f"❌ Error loading improved models: {e}")
         print("💡 Try running: python improved_model.py")
-        return None, None, None, None, None, None
-
-def get_movie_genres(row, available_genres):
-    """Extract genres for a movie row"""
-    return [genre for genre in available_genres if row[genre] == 1]
+        return None, None, None, None, None, None, None, None, None, None, None
 
-def get_enhanced_poster_url(row, title, available_genres, year=None):
+def get_enhanced_poster_url(position, poster_path, title, genres, year=None):
     """Get enhanced poster URL using the improved image handler"""
-    # Get genres for this movie
-    genres = get_movie_genres(row, available_genres)
-    
-    # Use the enhanced image handler
+    # The handler reads poster_path and uses the row name in its cache key
+    row = SimpleNamespace(name=position, poster_path=poster_path)
     return image_handler.get_movie_poster(row, title, genres, year)
 
-def create_movie_dict(row, idx, available_genres):
-    """Create a standardized movie dictionary with enhanced images"""
-    # Handle NaN values properly
-    overview = row['overview'] if pd.notna(row['overview']) else "No overview available"
-    title = row['original_title'] if pd.notna(row['original_title']) else "Unknown Title"
-    
-    # Truncate overview if too long
-    if len(str(overview)) > 200:
-        overview = str(overview)[:200] + "..."
-    
-    # Extract year from release_date
-    year = 2000  # default
-    if pd.notna(row.get('release_date')):
-        try:
-            year_str = str(row['release_date'])[:4]
-            year = int(year_str) if year_str.isdigit() else 2000
-        except:
-            year = 2000
-    
-    # Get enhanced poster URL
-    poster_url = get_enhanced_poster_url(row, str(title), available_genres, year)
-    
-    # Get genres
-    genres = get_movie_genres(row, available_genres)
-    
-    # Safely convert ID to integer
-    try:
-        movie_id_val = int(float(str(row.get('id', idx))))
-    except (ValueError, TypeError):
-        movie_id_val = idx
-    
-    return {
-        "id": movie_id_val,
-        "title": str(title),
-        "overview": str(overview),
-        "year": year,
-        "genres": genres,
-        "genre": genres[0] if genres else "drama",  # Primary genre for compatibility
-        "img": poster_url
-    }
+# Card fields of the enhanced movie dictionary
+MOVIE_FIELDS = CARD_FIELDS + ('genres',)
+DETAIL_FIELDS = MOVIE_FIELDS + ('budget', 'adult')
 
 # Load models
-knn_model, tfidf_vectorizer, movies_df, X, scaler, available_genres = load_models()
+knn_model, tfidf_vectorizer, movies_df, X, scaler, available_genres, movie_index, card_store, knn_engine, title_index, filter_index = load_models()
 
 @app.route('/')
 def home():
@@ -167,12 +117,8 @@ def get_movies():
         return jsonify({"movies": []})
     
     # Return first 50 movies with enhanced images
-    movies_list = []
-    for idx, row in movies_df.head(50).iterrows():
-        movie_dict = create_movie_dict(row, idx, available_genres)
-        movies_list.append(movie_dict)
-    
-    return jsonify({"movies": movies_list})
+    positions = np.arange(min(50, len(card_store)))
+    return jsonify({"movies": card_store.cards(positions, MOVIE_FIELDS)})
 
 @app.route('/api/search', methods=['GET'])
 def search_movies():
@@ -185,15 +131,15 @@ def search_movies():
     if not query:
         return jsonify({"movies": []})
     
-    # Filter movies by title
-    filtered_movies = movies_df[movies_df['original_title'].str.lower().str.contains(query, na=False)]
-    
-    movies_list = []
-    for idx, row in filtered_movies.head(20).iterrows():
-        movie_dict = create_movie_dict(row, idx, available_genres)
-        movies_list.append(movie_dict)
+    try:
+        # Filters are applied before the 20-result cut
+        allowed = filter_index.parse_mask(request.args)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid filter: {str(e)}"}), 400
     
-    return jsonify({"movies": movies_list})
+    # Literal substring match on the title index (exact and prefix matches first)
+    positions = title_index.search(query, limit=20, allowed=allowed)
+    return jsonify({"movies": card_store.cards(positions, MOVIE_FIELDS)})
 
 @app.route('/api/movie/<int:movie_id>', methods=['GET'])
 def get_movie_details(movie_id):
@@ -202,30 +148,14 @@ def get_movie_details(movie_id):
         return jsonify({"error": "Movies data not loaded"}), 500
     
     try:
-        # Find movie by ID
-        movie_row = None
-        movie_idx = None
-        for idx, row in movies_df.iterrows():
-            try:
-                row_id = int(float(str(row.get('id', idx))))
-                if row_id == movie_id:
-                    movie_row = row
-                    movie_idx = idx
-                    break
-            except (ValueError, TypeError):
-                continue
+        # Find movie index by ID
+        movie_idx = movie_index.position(movie_id)
         
-        if movie_row is None:
+        if movie_idx is None:
             return jsonify({"error": f"Movie with ID {movie_id} not found"}), 404
         
         # Create detailed movie dictionary
-        movie_dict = create_movie_dict(movie_row, movie_idx, available_genres)
-        
-        # Add additional details
-        movie_dict.update({
-            "budget": float(movie_row.get('budget_norm', 0)) if pd.notna(movie_row.get('budget_norm')) else 0,
-            "adult": bool(movie_row.get('adult', False))
-        })
+        movie_dict = card_store.card(movie_idx, DETAIL_FIELDS)
         
         return jsonify({"movie": movie_dict})
         
@@ -241,43 +171,27 @@ def recommend_movies(movie_id):
     
     try:
         # Find movie index by ID
-        movie_idx = None
-        movie_row = None
-        for idx, row in movies_df.iterrows():
-            try:
-                row_id = int(float(str(row.get('id', idx))))
-                if row_id == movie_id:
-                    movie_idx = idx
-                    movie_row = row
-                    break
-            except (ValueError, TypeError):
-                continue
+        movie_idx = movie_index.position(movie_id)
         
         if movie_idx is None:
             return jsonify({"error": f"Movie with ID {movie_id} not found"}), 404
         
-        print(f"Finding recommendations for: {movie_row['original_title']}")
+        selected_movie_title = card_store.columns['title'][movie_idx]
+        
+        print(f"Finding recommendations for: {selected_movie_title}")
         
-        # Get recommendations using improved model
-        distances, indices = knn_model.kneighbors([X[movie_idx]])
-        recommended_indices = indices[0][1:]  # Exclude the movie itself
+        # Get recommendations using improved model (same ranking as knn_model.kneighbors)
+        distances, indices = knn_engine.kneighbors(movie_idx)
+        recommended_indices = indices[1:]  # Exclude the movie itself
         
         # Convert cosine distances to similarity scores
-        similarities = 1 - distances[0][1:]
+        similarities = 1 - distances[1:]
         
-        recommendations = []
-        for i, idx in enumerate(recommended_indices):
-            row = movies_df.iloc[idx]
-            
-            # Create movie dictionary with enhanced images
-            movie_dict = create_movie_dict(row, idx, available_genres)
-            
+        # Movie dictionaries with enhanced images
+        recommendations = card_store.cards(recommended_indices, MOVIE_FIELDS)
+        for movie_dict, similarity_score in zip(recommendations, similarities):
             # Add similarity score
-            movie_dict["similarity_score"] = float(similarities[i])
-            
-            recommendations.append(movie_dict)
-        
-        selected_movie_title = str(movie_row['original_title']) if pd.notna(movie_row['original_title']) else "Unknown Title"
+            movie_dict["similarity_score"] = float(similarity_score)
         
         return jsonify({
             "movie": {
@@ -299,17 +213,13 @@ def get_popular_movies():
     
     try:
         # Get movies with good titles
-        popular_movies = movies_df.head(500)
-        popular_movies = popular_movies[popular_movies['original_title'].notna()]
+        popular_positions = np.flatnonzero(card_store.has_title[:500])
         
         # Sample 6 movies
-        sample_size = min(6, len(popular_movies))
-        sampled = popular_movies.sample(n=sample_size)
+        sample_size = min(6, len(popular_positions))
+        sampled = np.random.choice(popular_positions, sample_size, replace=False)
         
-        movies_list = []
-        for idx, row in sampled.iterrows():
-            movie_dict = create_movie_dict(row, idx, available_genres)
-            movies_list.append(movie_dict)
+        movies_list = card_store.cards(sampled, MOVIE_FIELDS)
         
         return jsonify({"movies": movies_list})
         
@@ -325,9 +235,7 @@ def recommend_random():
     
     try:
         # Pick a random popular movie
-        random_idx = np.random.randint(0, min(1000, len(movies_df)))
-        movie_row = movies_df.iloc[random_idx]
-        movie_id = int(movie_row.get('id', random_idx))
+        movie_id = movie_index.random_id(limit=1000)
         
         return recommend_movies(movie_id)
     except Exception as e:
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Recall@10 and query latency of the IVF ANN index against exact cosine
+NearestNeighbors, for several catalog sizes and n_probe settings.
+
+Catalogs larger than the saved feature matrix are simulated by appending
+jittered copies of its rows (non-zero entries scaled by random noise).
+
+Usage: python benchmark_ann_index.py [feature_prefix] [size_multiplier ...]
+       (defaults: improved_features, 0.25 1 4)
+"""
+
+import sys
+import time
+import numpy as np
+from sklearn.neighbors import NearestNeighbors
+from feature_store import read_feature_matrix
+from knn_engine import KNNEngine
+from ann_index import IVFIndex
+
+N_QUERIES = 200
+RECALL_AT = 10
+N_PROBES = [1, 2, 4, 8, 16, 32]
+
+def catalog_of_size(X, n_rows, rng):
+    """First n_rows of X, padded with jittered copies of random rows if X is smaller"""
+    X = np.asarray(X.toarray() if hasattr(X, 'toarray') else X, dtype=np.float32)
+    if n_rows <= X.shape[0]:
+        return X[:n_rows]
+    extra = X[rng.randint(0, X.shape[0], n_rows - X.shape[0])]
+    extra = extra * rng.lognormal(0, 0.3, extra.shape).astype(np.float32)
+    return np.vstack([X, extra])
+
+def neighbors_without_self(indices, position):
+    """First RECALL_AT neighbors, skipping the query row itself"""
+    return [i for i in indices if i != position][:RECALL_AT]
+
+def time_queries(fn, query_rows):
+    """Per-query latency in milliseconds and the neighbors returned"""
+    timings = []
+    results = []
+    for row in query_rows:
+        start = time.perf_counter()
+        _, indices = fn(row)
+        timings.append((time.perf_counter() - start) * 1000)
+        results.append(neighbors_without_self(indices, row))
+    return np.array(timings), results
+
+def recall(results, truth):
+    """Mean fraction of the exact neighbors that were found"""
+    return np.mean([len(set(found) & set(exact)) / len(exact) for found, exact in zip(results, truth)])
+
+def run_benchmark(feature_prefix, multipliers):
+    print(f"📊 Loading feature matrix artifact {feature_prefix}...")
+    X, _, _ = read_feature_matrix(feature_prefix)
+    print(f"✅ Loaded feature matrix {X.shape}")
+    rng = np.random.RandomState(42)
+
+    for multiplier in multipliers:
+        n_rows = max(RECALL_AT + 2, int(X.shape[0] * multiplier))
+        catalog = catalog_of_size(X, n_rows, rng)
+        query_rows = rng.randint(0, n_rows, N_QUERIES)
+
+        exact = NearestNeighbors(n_neighbors=RECALL_AT + 1, metric='cosine').fit(catalog)
+        _, exact_indices = exact.kneighbors(catalog[query_rows])
+        truth = [neighbors_without_self(indices, row) for indices, row in zip(exact_indices, query_rows)]
+
+        engine = KNNEngine(catalog, metric='cosine', n_neighbors=RECALL_AT + 1)
+        start = time.perf_counter()
+        index = IVFIndex.build(catalog, n_neighbors=RECALL_AT + 1)
+        build_seconds = time.perf_counter() - start
+
+        print(f"\n{n_rows} movies, {index.n_lists} lists (built in {build_seconds:.1f}s)")
+        print(f"{'method':>16} {'recall@10':>10} {'p50 ms':>8} {'p99 ms':>8} {'scanned':>8}")
+        print("-" * 54)
+        timings, results = time_queries(engine.kneighbors, query_rows)
+        print(f"{'exact engine':>16} {recall(results, truth):>10.3f} {np.percentile(timings, 50):>8.2f} "
+              f"{np.percentile(timings, 99):>8.2f} {1:>8.0%}")
+        for n_probe in N_PROBES:
+            if n_probe > index.n_lists:
+                break
+            timings, results = time_queries(lambda row: index.kneighbors(row, n_probe=n_probe), query_rows)
+            scanned = np.mean([len(index.candidates(index.vectors[row], n_probe)) for row in query_rows[:20]]) / n_rows
+            print(f"{f'ivf n_probe={n_probe}':>16} {recall(results, truth):>10.3f} {np.percentile(timings, 50):>8.2f} "
+                  f"{np.percentile(timings, 99):>8.2f} {scanned:>8.1%}")
+
+if __name__ == '__main__':
+    feature_prefix = sys.argv[1] if len(sys.argv) > 1 else 'improved_features'
+    multipliers = [float(arg) for arg in sys.argv[2:]] or [0.25, 1, 4]
+    run_benchmark(feature_prefix, multipliers)
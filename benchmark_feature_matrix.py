@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Compare dense vs sparse (CSR) feature matrices for the cosine KNN:
+memory footprint, build time and per-query kneighbors latency.
+
+Usage: python benchmark_feature_matrix.py [max_features ...]
+"""
+
+import sys
+import time
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.neighbors import NearestNeighbors
+from sklearn.preprocessing import StandardScaler
+from feature_store import FEATURE_WEIGHTS, build_feature_matrix
+
+N_QUERIES = 100
+
+def matrix_bytes(X):
+    """Bytes held by a dense array or the three CSR arrays"""
+    if sp.issparse(X):
+        return X.data.nbytes + X.indices.nbytes + X.indptr.nbytes
+    return X.nbytes
+
+def time_queries(knn, X, query_rows):
+    """Per-query kneighbors latency in milliseconds"""
+    timings = []
+    results = []
+    for row in query_rows:
+        start = time.perf_counter()
+        _, indices = knn.kneighbors(X[row:row + 1])
+        timings.append((time.perf_counter() - start) * 1000)
+        results.append(indices[0])
+    return np.array(timings), results
+
+def run_benchmark(max_features_list):
+    print("📊 Loading preprocessed data...")
+    movies_df = pd.read_csv('movies_preprocessed.csv', low_memory=False)
+    movies_df['adult'] = movies_df['adult'].map({'True': 1, 'False': 0, True: 1, False: 0})
+    text_data = movies_df['overview'].fillna('') + ' ' + movies_df['original_title'].fillna('')
+    print(f"✅ Loaded {len(movies_df)} movies")
+
+    scaler = StandardScaler().fit(movies_df[['budget_norm', 'adult']].fillna(0).values)
+    query_rows = np.random.RandomState(42).randint(0, len(movies_df), N_QUERIES)
+
+    print(f"\n{'features':>8} {'format':>7} {'memory MB':>10} {'build s':>8} {'fit s':>6} {'p50 ms':>7} {'p95 ms':>7} {'density':>8}")
+    print("-" * 70)
+    for max_features in max_features_list:
+        tfidf = TfidfVectorizer(max_features=max_features, stop_words='english',
+                                ngram_range=(1, 2), min_df=2, max_df=0.8)
+        tfidf.fit(text_data)
+
+        neighbor_sets = {}
+        for matrix_format in ('dense', 'sparse'):
+            start = time.perf_counter()
+            X, _ = build_feature_matrix(movies_df, tfidf, scaler, FEATURE_WEIGHTS, matrix_format)
+            build_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            knn = NearestNeighbors(n_neighbors=11, metric='cosine').fit(X)
+            fit_seconds = time.perf_counter() - start
+
+            timings, neighbor_sets[matrix_format] = time_queries(knn, X, query_rows)
+            nnz = X.nnz if sp.issparse(X) else np.count_nonzero(X)
+            density = nnz / (X.shape[0] * X.shape[1])
+
+            print(f"{max_features:>8} {matrix_format:>7} {matrix_bytes(X) / 1e6:>10.1f} {build_seconds:>8.2f} "
+                  f"{fit_seconds:>6.2f} {np.percentile(timings, 50):>7.2f} {np.percentile(timings, 95):>7.2f} {density:>8.4f}")
+            del X, knn
+
+        same = sum(set(a) == set(b) for a, b in zip(neighbor_sets['dense'], neighbor_sets['sparse']))
+        print(f"{'':>8} neighbor sets identical for {same}/{N_QUERIES} queries")
+
+if __name__ == '__main__':
+    sizes = [int(arg) for arg in sys.argv[1:]] or [500, 2000, 5000]
+    run_benchmark(sizes)
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Compare per-request knn_model.kneighbors against the pre-normalized
+KNNEngine on the saved feature matrix: latency and ranking agreement.
+
+Usage: python benchmark_knn_engine.py [feature_prefix] [knn_model_path]
+       (defaults: improved_features, improved_knn_model.joblib)
+"""
+
+import sys
+import time
+import joblib
+import numpy as np
+from feature_store import read_feature_matrix
+from knn_engine import KNNEngine
+
+N_QUERIES = 200
+
+def time_calls(fn, query_rows):
+    """Per-call latency in milliseconds and the neighbor indices returned"""
+    timings = []
+    results = []
+    for row in query_rows:
+        start = time.perf_counter()
+        indices = fn(row)
+        timings.append((time.perf_counter() - start) * 1000)
+        results.append(indices)
+    return np.array(timings), results
+
+def run_benchmark(feature_prefix, model_path):
+    print(f"📊 Loading {feature_prefix} and {model_path}...")
+    X, _, _ = read_feature_matrix(feature_prefix)
+    knn_model = joblib.load(model_path)
+    print(f"✅ Feature matrix {X.shape}, {knn_model.effective_metric_} metric, {knn_model.n_neighbors} neighbors")
+
+    start = time.perf_counter()
+    engine = KNNEngine.from_model(knn_model, X)
+    print(f"✅ Engine built in {time.perf_counter() - start:.2f}s")
+
+    query_rows = np.random.RandomState(42).randint(0, X.shape[0], N_QUERIES)
+    sklearn_timings, sklearn_results = time_calls(lambda row: knn_model.kneighbors(X[row:row + 1])[1][0], query_rows)
+    engine_timings, engine_results = time_calls(lambda row: engine.kneighbors(row)[1], query_rows)
+
+    print(f"\n{'method':>20} {'p50 ms':>8} {'p95 ms':>8} {'mean ms':>8}")
+    print("-" * 48)
+    for name, timings in (('knn_model.kneighbors', sklearn_timings), ('KNNEngine', engine_timings)):
+        print(f"{name:>20} {np.percentile(timings, 50):>8.2f} {np.percentile(timings, 95):>8.2f} {timings.mean():>8.2f}")
+    print(f"\nSpeedup (p50): {np.percentile(sklearn_timings, 50) / np.percentile(engine_timings, 50):.1f}x")
+
+    same_order = sum(list(a) == list(b) for a, b in zip(sklearn_results, engine_results))
+    same_set = sum(set(a) == set(b) for a, b in zip(sklearn_results, engine_results))
+    print(f"Identical ranking for {same_order}/{N_QUERIES} queries, identical neighbor sets for {same_set}/{N_QUERIES}")
+    print("(differences can only come from exactly tied distances)")
+
+if __name__ == '__main__':
+    feature_prefix = sys.argv[1] if len(sys.argv) > 1 else 'improved_features'
+    model_path = sys.argv[2] if len(sys.argv) > 2 else 'improved_knn_model.joblib'
+    run_benchmark(feature_prefix, model_path)
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Bytes on the wire and CPU per response for the stdlib json encoder used by
+jsonify, orjson and msgpack, each sent plain, gzip'd and brotli'd.
+Payloads are built from the catalog snapshot like the API builds them.
+
+Usage: python benchmark_serialization.py [n_repeats]
+       (default: 200 encodings of every payload)
+"""
+
+import json
+import sys
+import time
+import numpy as np
+from card_store import DETAIL_FIELDS, MovieCardStore
+from catalog_snapshot import load_catalog
+from feature_store import GENRE_COLUMNS
+from movie_index import MovieIdIndex
+import serialization
+from serialization import compress, encode_json, encode_msgpack, numpy_default
+
+N_REPEATS = 200
+
+def build_payloads(card_store, n_recommendations=10, page_size=20):
+    """Typical /api/recommend, /api/movies and /api/movie responses, scores left as numpy floats"""
+    rows = np.random.RandomState(42).permutation(len(card_store))
+    recommendations = card_store.cards(rows[1:n_recommendations + 1])
+    for recommendation, score in zip(recommendations, np.linspace(0.95, 0.80, n_recommendations, dtype=np.float32)):
+        recommendation["similarity_score"] = score
+    seed = card_store.card(rows[0])
+    return {
+        "recommend": {"movie": {"id": seed["id"], "title": seed["title"]}, "recommendations": recommendations, "next_cursor": str(n_recommendations)},
+        "movies": {"movies": card_store.cards(rows[:page_size])},
+        "movie": card_store.card(rows[0], DETAIL_FIELDS),
+    }
+
+def stdlib_json(obj):
+    """What jsonify produced before: sorted keys through the json module"""
+    return json.dumps(obj, default=numpy_default, sort_keys=True, separators=(',', ':')).encode()
+
+def time_per_call(fn, arg, n_repeats):
+    """Mean microseconds per call"""
+    start = time.perf_counter()
+    for _ in range(n_repeats):
+        fn(arg)
+    return (time.perf_counter() - start) / n_repeats * 1e6
+
+def run_benchmark(n_repeats):
+    print("📊 Loading catalog snapshot...")
+    movies_df = load_catalog()
+    card_store = MovieCardStore(movies_df, GENRE_COLUMNS, MovieIdIndex(movies_df).ids)
+    payloads = build_payloads(card_store)
+    print(f"✅ {len(card_store)} movie cards")
+
+    encoders = [('json', stdlib_json)]
+    if serialization.orjson is not None:
+        encoders.append(('orjson', encode_json))
+    if serialization.msgpack is not None:
+        encoders.append(('msgpack', encode_msgpack))
+    encodings = ['identity', 'gzip'] + (['br'] if serialization.brotli is not None else [])
+
+    print(f"\n{'payload':>10} {'encoder':>8} {'encode us':>10}" + ''.join(f" {name + ' B':>12} {name + ' us':>10}" for name in encodings))
+    print("-" * (30 + 23 * len(encodings)))
+    for payload_name, payload in payloads.items():
+        for encoder_name, encoder in encoders:
+            encode_us = time_per_call(encoder, payload, n_repeats)
+            body = encoder(payload)
+            line = f"{payload_name:>10} {encoder_name:>8} {encode_us:>10.1f}"
+            for encoding in encodings:
+                if encoding == 'identity':
+                    line += f" {len(body):>12} {0.0:>10.1f}"
+                else:
+                    compress_us = time_per_call(lambda data: compress(data, encoding), body, n_repeats)
+                    line += f" {len(compress(body, encoding)):>12} {compress_us:>10.1f}"
+            print(line)
+    print(f"\nBodies under {serialization.COMPRESSION_THRESHOLD} bytes are always sent uncompressed")
+
+if __name__ == '__main__':
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else N_REPEATS)
@@ -0,0 +1,118 @@
+import numpy as np
+import scipy.sparse as sp
+from feature_store import FEATURE_WEIGHTS
+
+# Shared TF-IDF terms listed per explained recommendation
+EXPLAIN_TERMS = 5
+
+# Request parameter for each feature block's weight, named like the variables in improved_model.py
+WEIGHT_PARAMS = {name: f"{name}_weight" for name in FEATURE_WEIGHTS}
+
+def parse_weights(args, base_weights=FEATURE_WEIGHTS):
+    """Block weights from request parameters (missing ones keep their base value), or None if none are given"""
+    given = {name: args.get(param) for name, param in WEIGHT_PARAMS.items() if args.get(param) not in (None, '')}
+    if not given:
+        return None
+
+    weights = dict(base_weights)
+    for name, value in given.items():
+        weight = float(value)
+        if not np.isfinite(weight) or weight < 0:
+            raise ValueError(f"{WEIGHT_PARAMS[name]} must be a non-negative number")
+        weights[name] = weight
+    if not any(weights.values()):
+        raise ValueError("At least one block weight must be positive")
+    return weights
+
+def block_squared_norms(matrix):
+    """float64 squared L2 norm of every row of a dense or CSR block"""
+    if sp.issparse(matrix):
+        return np.asarray(matrix.multiply(matrix).sum(axis=1), dtype=np.float64).ravel()
+    return np.einsum('ij,ij->i', matrix, matrix, dtype=np.float64)
+
+class BlockWeightedScorer:
+    """Cosine kNN for arbitrary block weights, computed from the L2-normalized rows the engine already scans"""
+
+    def __init__(self, vectors, blocks, base_weights=FEATURE_WEIGHTS, text_terms=None):
+        self.names = [name for name, _ in blocks]
+        # Vocabulary of the 'text' block, in column order, for explanations
+        self.text_terms = None if text_terms is None else np.asarray(text_terms, dtype=object)
+        self.base_weights = np.array([base_weights[name] for name in self.names], dtype=np.float64)
+        if not np.all(self.base_weights > 0):
+            raise ValueError("Blocks with a zero base weight cannot be reweighted")
+
+        self.blocks = []
+        start = 0
+        for _, width in blocks:
+            block = vectors[:, start:start + width]
+            # Column slices of a CSR matrix are copied once here instead of per query
+            self.blocks.append(block.tocsr() if sp.issparse(block) else block)
+            start += width
+        # Per-block squared norms of every normalized row, cached for any weights
+        self.block_norms = np.column_stack([block_squared_norms(block) for block in self.blocks])
+
+    def __len__(self):
+        return self.block_norms.shape[0]
+
+    def _ratios(self, weights):
+        # Changing block b's weight from w_b to v_b scales its dot products and squared norms
+        # by (v_b / w_b)^2; the rows' common normalization cancels in the cosine
+        return (np.array([weights[name] for name in self.names], dtype=np.float64) / self.base_weights) ** 2
+
+    def kneighbors(self, position, n_neighbors, weights, allowed=None):
+        """(cosine distances, indices) under the given block weights, the row itself included"""
+        ratios = self._ratios(weights)
+        products = np.zeros(len(self), dtype=np.float64)
+        for ratio, block in zip(ratios, self.blocks):
+            if ratio:
+                query = block[position]
+                query = query.toarray().ravel() if sp.issparse(query) else np.asarray(query)
+                products += ratio * np.asarray(block @ query, dtype=np.float64).ravel()
+
+        norms = np.sqrt(self.block_norms @ ratios) * np.sqrt(self.block_norms[position] @ ratios)
+        similarities = np.divide(products, norms, out=np.zeros_like(products), where=norms > 0)
+        distances = np.clip(1.0 - similarities, 0, 2)
+        if allowed is not None:
+            distances = np.where(allowed, distances, np.inf)
+
+        n_neighbors = min(n_neighbors, len(self) if allowed is None else int(allowed.sum()))
+        if n_neighbors == 0:
+            return np.empty(0), np.empty(0, dtype=np.intp)
+        if n_neighbors < len(self):
+            candidates = np.argpartition(distances, n_neighbors - 1)[:n_neighbors]
+        else:
+            candidates = np.arange(len(self))
+        # Ties are broken by row position so results are deterministic
+        order = np.lexsort((candidates, distances[candidates]))[:n_neighbors]
+        return distances[candidates[order]], candidates[order]
+
+    def explain(self, position, neighbors, weights=None, n_terms=EXPLAIN_TERMS):
+        """Per-block share of each neighbor's cosine score and the top TF-IDF terms it shares with the seed"""
+        neighbors = np.asarray(neighbors, dtype=np.intp)
+        ratios = np.ones(len(self.names)) if weights is None else self._ratios(weights)
+        norms = np.sqrt(self.block_norms[neighbors] @ ratios) * np.sqrt(self.block_norms[position] @ ratios)
+        norms = np.where(norms > 0, norms, 1.0)
+
+        # Only the k returned rows are touched: one small product per block
+        contributions = {}
+        shared = None
+        for name, ratio, block in zip(self.names, ratios, self.blocks):
+            query = block[position]
+            rows = block[neighbors]
+            if sp.issparse(rows):
+                products = rows.multiply(query.toarray()).tocsr()
+            else:
+                products = sp.csr_matrix(np.asarray(rows) * np.asarray(query))
+            contributions[name] = ratio * np.asarray(products.sum(axis=1), dtype=np.float64).ravel() / norms
+            if name == 'text':
+                shared = products
+
+        explanations = []
+        for i in range(len(neighbors)):
+            explanation = {"blocks": {name: float(values[i]) for name, values in contributions.items()}}
+            if shared is not None and self.text_terms is not None:
+                start, end = shared.indptr[i], shared.indptr[i + 1]
+                top = np.argsort(-shared.data[start:end], kind='stable')[:n_terms]
+                explanation["shared_terms"] = self.text_terms[shared.indices[start:end][top]].tolist()
+            explanations.append(explanation)
+        return explanations
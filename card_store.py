@@ -0,0 +1,150 @@
+import numpy as np
+import pandas as pd
+
+# Fields of the compact card used by list endpoints (/api/movies, /api/search, ...)
+CARD_FIELDS = ('id', 'title', 'overview', 'year', 'genre', 'img')
+# Fields of the full card returned by /api/movie/<id>
+DETAIL_FIELDS = ('id', 'title', 'overview_full', 'year', 'genres', 'img', 'budget', 'adult')
+
+def parse_fields(value, extra=()):
+    """Card fields named in a comma-separated fields= parameter (id always first), or every field when absent"""
+    if not value:
+        return CARD_FIELDS + tuple(extra)
+    requested = [field.strip() for field in value.split(',') if field.strip()]
+    unknown = [field for field in requested if field not in CARD_FIELDS and field not in extra]
+    if unknown:
+        raise ValueError(f"Unknown field(s) {', '.join(unknown)}; expected {', '.join(CARD_FIELDS + tuple(extra))}")
+    # Clients always need the id to open a movie
+    return ('id',) + tuple(dict.fromkeys(field for field in requested if field != 'id'))
+
+OVERVIEW_LIMIT = 200
+DEFAULT_GENRE = "drama"
+# Shown on cards of movies without a release date
+DEFAULT_YEAR = 2000
+
+# Genre-based placeholder colors (background, text)
+GENRE_COLORS = {
+    'Action': ('8B0000', 'FFD700'),      # Dark red, gold
+    'Adventure': ('228B22', 'FFFFFF'),    # Forest green, white
+    'Animation': ('FF69B4', 'FFFFFF'),    # Hot pink, white
+    'Comedy': ('FF8C00', 'FFFFFF'),       # Dark orange, white
+    'Crime': ('2F4F4F', 'FF0000'),        # Dark slate gray, red
+    'Drama': ('4B0082', 'FFFFFF'),        # Indigo, white
+    'Family': ('32CD32', 'FFFFFF'),       # Lime green, white
+    'Fantasy': ('9370DB', 'FFD700'),      # Medium purple, gold
+    'Horror': ('000000', 'FF0000'),       # Black, red
+    'Romance': ('DC143C', 'FFFFFF'),      # Crimson, white
+    'Science Fiction': ('4169E1', 'FFFFFF'), # Royal blue, white
+    'Thriller': ('8B0000', 'FFFFFF'),     # Dark red, white
+    'War': ('556B2F', 'FFFFFF'),          # Dark olive green, white
+    'Western': ('D2691E', 'FFFFFF'),      # Chocolate, white
+}
+
+def genre_poster_urls(poster_paths, titles, genre_matrix, genre_names):
+    """Vectorized poster URLs: TMDB path if present, else a genre-colored placeholder"""
+    n = len(titles)
+
+    # Colors come from the first genre (in column order) that has a color scheme
+    bg_colors = np.full(n, '1a1a2e', dtype=object)
+    text_colors = np.full(n, 'ffffff', dtype=object)
+    colored = [i for i, genre in enumerate(genre_names) if genre in GENRE_COLORS]
+    if colored and n:
+        colored_matrix = genre_matrix[:, colored]
+        has_color = colored_matrix.any(axis=1)
+        first = np.asarray(colored)[colored_matrix.argmax(axis=1)]
+        for i in np.flatnonzero(has_color):
+            bg_colors[i], text_colors[i] = GENRE_COLORS[genre_names[first[i]]]
+
+    # Clean title for URL - remove special characters and limit length
+    clean_titles = (titles.str.replace(r'[^\w\s-]', '', regex=True)
+                    .str.strip()
+                    .str.replace(r'\s+', '+', regex=True)
+                    .str[:25])
+    clean_titles = clean_titles.where(clean_titles != '', 'Movie')
+    clean_titles = clean_titles.where((titles != '') & (titles != 'Unknown Title'), 'No+Poster')
+    placeholders = ("https://via.placeholder.com/300x450/" + pd.Series(bg_colors, index=titles.index) + "/" +
+                    pd.Series(text_colors, index=titles.index) + "?text=" + clean_titles)
+
+    paths = poster_paths.astype(str).str.strip()
+    has_poster = poster_paths.notna() & (paths != '')
+    paths = paths.where(paths.str.startswith('/'), '/' + paths)
+    tmdb = "https://image.tmdb.org/t/p/w500" + paths
+    return tmdb.where(has_poster, placeholders).to_numpy(dtype=object)
+
+class MovieCardStore:
+    """Movie card fields computed once for the whole catalog and gathered by row position"""
+
+    def __init__(self, movies_df, genre_columns, row_ids, poster_fn=None, primary_genres=True):
+        n = len(movies_df)
+        positions = np.arange(n)
+        titles = movies_df['original_title'].astype(object).where(movies_df['original_title'].notna(), "Unknown Title").astype(str)
+        overviews = movies_df['overview'].astype(object).where(movies_df['overview'].notna(), "No overview available").astype(str)
+        truncated = overviews.where(overviews.str.len() <= OVERVIEW_LIMIT, overviews.str[:OVERVIEW_LIMIT] + "...")
+
+        genre_names = [col for col in genre_columns if col in movies_df.columns]
+        genre_matrix = movies_df[genre_names].to_numpy() == 1 if genre_names else np.zeros((n, 0), dtype=bool)
+        genre_lists = [[] for _ in range(n)]
+        for row, col in zip(*np.nonzero(genre_matrix)):
+            genre_lists[row].append(genre_names[col])
+        # Apps without genre-aware list cards keep the "drama" default
+        primary = np.full(n, DEFAULT_GENRE, dtype=object)
+        if genre_names and primary_genres:
+            has_genre = genre_matrix.any(axis=1)
+            primary[has_genre] = np.asarray(genre_names, dtype=object)[genre_matrix.argmax(axis=1)[has_genre]]
+
+        years = movies_df['year'].fillna(DEFAULT_YEAR).to_numpy(dtype=np.int64)
+        poster_paths = movies_df['poster_path']
+        if poster_fn is None:
+            images = genre_poster_urls(poster_paths, titles, genre_matrix, genre_names)
+        else:
+            # Custom poster logic still runs only once per movie, at load time
+            images = np.array([poster_fn(position, path, title, genres, int(year))
+                               for position, path, title, genres, year in zip(positions, poster_paths, titles, genre_lists, years)], dtype=object)
+
+        # Malformed ids fall back to the row position, like the old per-row conversion
+        ids = np.where(np.asarray(row_ids) >= 0, row_ids, positions)
+        budgets = movies_df['budget_norm'].fillna(0).astype(float)
+
+        def column(values):
+            column_array = np.empty(n, dtype=object)
+            column_array[:] = list(values)
+            return column_array
+
+        # Plain Python objects so cards can be serialized without per-field casts
+        self.columns = {
+            'id': column(ids.tolist()),
+            'title': column(titles),
+            'overview': column(truncated),
+            'overview_full': column(overviews),
+            'year': column(years.tolist()),
+            'genre': primary,
+            'genres': column(genre_lists),
+            'img': images,
+            'budget': column(budgets.tolist()),
+            'adult': column(movies_df['adult'].fillna(0).astype(bool).tolist()),
+        }
+        self.has_title = movies_df['original_title'].notna().to_numpy()
+        self.has_poster = poster_paths.notna().to_numpy()
+        self.poster_positions = np.flatnonzero(self.has_poster)
+
+    def __len__(self):
+        return len(self.has_poster)
+
+    def cards(self, positions, fields=CARD_FIELDS):
+        """Build card dicts for the given row positions"""
+        positions = np.asarray(positions, dtype=np.intp)
+        gathered = [self.columns[field][positions] for field in fields]
+        names = ['overview' if field == 'overview_full' else field for field in fields]
+        return [dict(zip(names, values)) for values in zip(*gathered)]
+
+    def card(self, position, fields=CARD_FIELDS):
+        """Card dict for a single row position"""
+        return self.cards([position], fields)[0]
+
+    def poster_first(self, limit, allowed=None):
+        """First `limit` positions with a poster, or the first rows if there are too few (within an optional row mask)"""
+        poster_positions = self.poster_positions if allowed is None else self.poster_positions[allowed[self.poster_positions]]
+        if len(poster_positions) >= limit:
+            return poster_positions[:limit]
+        rows = np.arange(len(self)) if allowed is None else np.flatnonzero(allowed)
+        return rows[:limit]
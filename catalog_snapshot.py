@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Build a typed, columnar snapshot of the movie catalog for the Flask apps.
+
+movies_preprocessed.csv and movies_metadata.csv are parsed and merged once
+here; the apps then load the single Parquet file instead of two full CSVs.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+from feature_store import atomic_write
+
+# Bump whenever the snapshot columns or dtypes change
+SNAPSHOT_VERSION = 3
+SNAPSHOT_PATH = f'movies_catalog_v{SNAPSHOT_VERSION}.parquet'
+
+PREPROCESSED_CSV = 'movies_preprocessed.csv'
+METADATA_CSV = 'movies_metadata.csv'
+
+# Columns the snapshot adds for serving only; they are not model features
+SERVING_ONLY_COLUMNS = ['poster_path', 'year', 'original_language', 'title', 'popularity']
+
+def parse_years(release_dates):
+    """Vectorized version of the endpoints' year parsing; missing or malformed dates stay null"""
+    year_str = release_dates.astype(str).str[:4]
+    is_year = release_dates.notna() & year_str.str.isdigit()
+    # Nullable, so year filters can leave undated movies out instead of treating them as 2000
+    return pd.to_numeric(year_str.where(is_year), errors='coerce').astype('Int16')
+
+def parse_ids(ids):
+    """Parse ids like int(float(str(id))); malformed ids become -1"""
+    parsed = pd.to_numeric(ids.astype(str), errors='coerce')
+    parsed = parsed.where(np.isfinite(parsed) & (parsed >= 0))
+    return np.trunc(parsed).fillna(-1).astype(np.int32)
+
+def build_catalog_snapshot(preprocessed_path=PREPROCESSED_CSV, metadata_path=METADATA_CSV, output_path=SNAPSHOT_PATH):
+    """Merge the two CSVs once and write the compact snapshot"""
+    print("Loading movie data...")
+    movies_df = pd.read_csv(preprocessed_path, low_memory=False)
+
+    print("Loading poster data...")
+    metadata_df = pd.read_csv(metadata_path, low_memory=False,
+                              usecols=['id', 'poster_path', 'release_date', 'original_language', 'title', 'popularity'])
+    # One metadata row per id so the merge keeps the rows the model was trained on
+    metadata_df = metadata_df.drop_duplicates(subset='id')
+    merged = movies_df.merge(metadata_df, on='id', how='left', suffixes=('', '_orig'))
+
+    one_hot_columns = [col for col in movies_df.columns
+                       if col not in ('id', 'original_title', 'overview', 'budget_norm', 'adult')]
+
+    snapshot = pd.DataFrame({
+        'id': parse_ids(merged['id']),
+        'original_title': merged['original_title'],
+        'overview': merged['overview'],
+        # Kept as float64 so scaled features match training exactly
+        'budget_norm': merged['budget_norm'].astype(np.float64),
+        'adult': merged['adult'].map({'True': 1, 'False': 0, True: 1, False: 0}).fillna(0).astype(np.int8),
+    })
+    one_hot = merged[one_hot_columns].fillna(0).astype(np.int8)
+    snapshot = pd.concat([snapshot, one_hot], axis=1)
+
+    snapshot['poster_path'] = merged['poster_path']
+    snapshot['year'] = parse_years(merged['release_date'])
+    snapshot['original_language'] = merged['original_language'].fillna('unknown').astype('category')
+    # Localized title and popularity rank title suggestions
+    snapshot['title'] = merged['title']
+    snapshot['popularity'] = pd.to_numeric(merged['popularity'], errors='coerce').fillna(0).astype(np.float32)
+
+    # Workers that find the snapshot stale rebuild it at the same time, each through its own temp file
+    with atomic_write(output_path) as f:
+        snapshot.to_parquet(f, index=False)
+
+    print(f"✅ Wrote {output_path}: {len(snapshot)} movies, {snapshot.shape[1]} columns, "
+          f"{snapshot.memory_usage(deep=True).sum() / 1e6:.1f} MB in memory")
+    return snapshot
+
+def snapshot_is_fresh(snapshot_path=SNAPSHOT_PATH, sources=(PREPROCESSED_CSV, METADATA_CSV)):
+    """True when the snapshot exists and is newer than the CSVs it was built from"""
+    if not os.path.exists(snapshot_path):
+        return False
+    snapshot_mtime = os.path.getmtime(snapshot_path)
+    return all(not os.path.exists(path) or os.path.getmtime(path) <= snapshot_mtime for path in sources)
+
+def load_catalog(snapshot_path=SNAPSHOT_PATH):
+    """Load the catalog snapshot, rebuilding it first if it is missing or stale"""
+    if snapshot_is_fresh(snapshot_path):
+        print(f"Loading catalog snapshot {snapshot_path}...")
+        return pd.read_parquet(snapshot_path)
+
+    print("Catalog snapshot missing or stale, rebuilding from CSV...")
+    return build_catalog_snapshot(output_path=snapshot_path)
+
+if __name__ == '__main__':
+    build_catalog_snapshot()
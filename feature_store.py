@@ -0,0 +1,176 @@
+import hashlib
+import json
+import os
+from contextlib import contextmanager
+import numpy as np
+import scipy.sparse as sp
+
+# Bump whenever the layout of the saved feature matrix changes
+FEATURE_ARTIFACT_VERSION = 1
+
+GENRE_COLUMNS = ['Action', 'Adventure', 'Animation', 'Comedy', 'Crime', 'Documentary',
+                 'Drama', 'Family', 'Fantasy', 'Horror', 'Music', 'Mystery',
+                 'Romance', 'Science Fiction', 'Thriller', 'War', 'Western']
+LANGUAGE_COLUMNS = ['en', 'fr', 'es', 'de', 'it', 'ja', 'ko', 'zh']
+
+# 'dense' keeps the classic numpy matrix, 'sparse' keeps X as CSR end-to-end
+FEATURE_MATRIX_FORMAT = os.environ.get('FEATURE_MATRIX_FORMAT', 'dense')
+
+# Same block weights as improved_model.py
+FEATURE_WEIGHTS = {
+    'text': 1.0,
+    'genre': 3.0,
+    'language': 0.5,
+    'numerical': 0.5,
+}
+
+def file_sha256(path):
+    """Hash a model file so the artifact can tell when it was retrained"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+@contextmanager
+def atomic_write(path, mode='wb'):
+    """Open a temp file next to path and rename it into place on success"""
+    # Per-process name: workers rebuilding the same artifact at once never write into
+    # (or rename away) each other's temp file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, mode) as f:
+            yield f
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def artifact_paths(prefix, matrix_format=FEATURE_MATRIX_FORMAT):
+    """Matrix, row id and manifest file names for an artifact prefix"""
+    matrix_ext = 'npz' if matrix_format == 'sparse' else 'npy'
+    return f"{prefix}.{matrix_ext}", f"{prefix}_ids.npy", f"{prefix}.json"
+
+def row_norms(X):
+    """float64 L2 norm of every row of a dense or CSR matrix (0 for zero rows)"""
+    if sp.issparse(X):
+        return np.sqrt(np.asarray(X.multiply(X).sum(axis=1), dtype=np.float64).ravel())
+    return np.sqrt(np.einsum('ij,ij->i', X, X, dtype=np.float64))
+
+def stack_feature_blocks(blocks, matrix_format=FEATURE_MATRIX_FORMAT):
+    """Concatenate weighted feature blocks into a dense array or a CSR matrix"""
+    if matrix_format == 'sparse':
+        return sp.hstack([sp.csr_matrix(block) for block in blocks], format='csr')
+    return np.hstack([block.toarray() if sp.issparse(block) else block for block in blocks])
+
+def build_feature_matrix(movies_df, tfidf_vectorizer, scaler, weights=FEATURE_WEIGHTS, matrix_format=FEATURE_MATRIX_FORMAT):
+    """Build the weighted feature matrix the same way improved_model.py does"""
+    text_data = movies_df['overview'].fillna('') + ' ' + movies_df['original_title'].fillna('')
+    # Stays sparse until stack_feature_blocks decides on the output format
+    text_features = tfidf_vectorizer.transform(text_data)
+
+    available_genres = [col for col in GENRE_COLUMNS if col in movies_df.columns]
+    genre_features = movies_df[available_genres].fillna(0).values
+
+    language_columns = [col for col in movies_df.columns if col in LANGUAGE_COLUMNS]
+    language_features = movies_df[language_columns].fillna(0).values if language_columns else np.zeros((len(movies_df), 1))
+
+    numerical_features = movies_df[['budget_norm', 'adult']].fillna(0).values
+    numerical_features_scaled = scaler.transform(numerical_features)
+
+    X = stack_feature_blocks([
+        text_features * weights['text'],
+        genre_features * weights['genre'],
+        language_features * weights['language'],
+        numerical_features_scaled * weights['numerical']
+    ], matrix_format)
+    blocks = [
+        ('text', text_features.shape[1]),
+        ('genre', genre_features.shape[1]),
+        ('language', language_features.shape[1]),
+        ('numerical', numerical_features_scaled.shape[1])
+    ]
+    return X, blocks
+
+def save_feature_matrix(prefix, X, row_ids, blocks, vectorizer_path, scaler_path, weights=FEATURE_WEIGHTS):
+    """Write X, its row -> movie id mapping and a manifest describing how it was built"""
+    matrix_format = 'sparse' if sp.issparse(X) else 'dense'
+    matrix_path, ids_path, manifest_path = artifact_paths(prefix, matrix_format)
+    manifest = {
+        'version': FEATURE_ARTIFACT_VERSION,
+        'format': matrix_format,
+        'shape': list(X.shape),
+        'dtype': str(X.dtype),
+        'vectorizer_sha256': file_sha256(vectorizer_path),
+        'scaler_sha256': file_sha256(scaler_path),
+        'weights': dict(weights),
+        'blocks': [[name, int(width)] for name, width in blocks],
+        'matrix_file': matrix_path,
+        'ids_file': ids_path
+    }
+
+    # Write to per-process temp files and rename, so a concurrent reader never sees half an
+    # artifact and concurrent writers never interleave; the manifest goes last
+    with atomic_write(matrix_path) as f:
+        if matrix_format == 'sparse':
+            sp.save_npz(f, X.tocsr(), compressed=False)
+        else:
+            np.save(f, np.ascontiguousarray(X))
+    with atomic_write(ids_path) as f:
+        np.save(f, np.asarray(row_ids, dtype=np.int64))
+    with atomic_write(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+def load_feature_matrix(prefix, row_ids, vectorizer_path, scaler_path, weights=FEATURE_WEIGHTS, matrix_format=FEATURE_MATRIX_FORMAT):
+    """Memory-map a saved feature matrix, or return (None, None) if it is missing or stale"""
+    matrix_path, ids_path, manifest_path = artifact_paths(prefix, matrix_format)
+    if not os.path.exists(manifest_path):
+        return None, None
+
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+        stale_reason = None
+        if manifest.get('version') != FEATURE_ARTIFACT_VERSION:
+            stale_reason = "artifact format changed"
+        elif manifest.get('format', 'dense') != matrix_format:
+            stale_reason = f"saved as {manifest.get('format', 'dense')}, {matrix_format} requested"
+        elif manifest.get('vectorizer_sha256') != file_sha256(vectorizer_path):
+            stale_reason = "TF-IDF vectorizer changed"
+        elif manifest.get('scaler_sha256') != file_sha256(scaler_path):
+            stale_reason = "scaler changed"
+        elif manifest.get('weights') != dict(weights):
+            stale_reason = "feature weights changed"
+        elif not np.array_equal(np.load(ids_path), np.asarray(row_ids, dtype=np.int64)):
+            stale_reason = "movie rows changed"
+
+        if stale_reason:
+            print(f"Feature artifact {matrix_path} is stale ({stale_reason})")
+            return None, None
+
+        # CSR matrices are loaded whole (they are small), dense ones are memory-mapped
+        if matrix_format == 'sparse':
+            X = sp.load_npz(matrix_path).tocsr()
+        else:
+            X = np.load(matrix_path, mmap_mode='r')
+        if list(X.shape) != manifest['shape']:
+            print(f"Feature artifact {matrix_path} has the wrong shape")
+            return None, None
+        return X, manifest
+
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Could not read feature artifact {matrix_path}: {e}")
+        return None, None
+
+def read_feature_matrix(prefix):
+    """Load a saved artifact as-is (no staleness checks) for offline jobs"""
+    with open(f"{prefix}.json") as f:
+        manifest = json.load(f)
+    if manifest.get('format', 'dense') == 'sparse':
+        X = sp.load_npz(manifest['matrix_file']).tocsr()
+    else:
+        X = np.load(manifest['matrix_file'], mmap_mode='r')
+    row_ids = np.load(manifest['ids_file'])
+    return X, row_ids, manifest
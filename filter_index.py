@@ -0,0 +1,93 @@
+from bisect import bisect_left, bisect_right
+import numpy as np
+from catalog_snapshot import SERVING_ONLY_COLUMNS
+
+# Columns of movies_preprocessed.csv that are not one-hot flags
+BASE_COLUMNS = ['id', 'original_title', 'overview', 'budget_norm', 'adult']
+
+# Extra names accepted for genres (the search page's dropdown uses "scifi")
+GENRE_ALIASES = {
+    'scifi': 'science fiction',
+    'sci-fi': 'science fiction',
+}
+
+def one_hot_columns(movies_df):
+    """(genre columns, language columns) emitted by preproccessing.py's one-hot encoders"""
+    flags = [col for col in movies_df.columns if col not in BASE_COLUMNS and col not in SERVING_ONLY_COLUMNS]
+    # Genre names are capitalized ("Action"), language codes are ISO 639-1 ("en")
+    languages = [col for col in flags if str(col) == str(col).lower()]
+    genres = [col for col in flags if col not in languages]
+    return genres, languages
+
+def parse_flag(value):
+    """Boolean query parameter: 1/0, true/false, yes/no"""
+    lowered = value.strip().lower()
+    if lowered in ('1', 'true', 'yes'):
+        return True
+    if lowered in ('0', 'false', 'no'):
+        return False
+    raise ValueError(f"Expected true or false, got '{value}'")
+
+class MovieFilterIndex:
+    """Packed per-genre, per-language and adult bitsets plus a sorted year array"""
+
+    def __init__(self, movies_df):
+        self.n = len(movies_df)
+        genres, languages = one_hot_columns(movies_df)
+        self.genre_bits = {genre.casefold(): np.packbits(movies_df[genre].to_numpy() == 1) for genre in genres}
+        self.language_bits = {str(language): np.packbits(movies_df[language].to_numpy() == 1) for language in languages}
+        self.adult_bits = np.packbits(movies_df['adult'].fillna(0).to_numpy().astype(bool))
+        self.all_bits = np.packbits(np.ones(self.n, dtype=bool))
+
+        # Undated movies are left out, so they never match a year range
+        dated = movies_df['year'].notna().to_numpy()
+        years = movies_df['year'][dated].to_numpy(dtype=np.int64)
+        order = np.argsort(years, kind='stable')
+        self.year_order = np.flatnonzero(dated)[order]
+        self.sorted_years = years[order].tolist()
+
+    def __len__(self):
+        return self.n
+
+    def year_bits(self, year_from=None, year_to=None):
+        """Bitset of the movies released between year_from and year_to (inclusive)"""
+        start = 0 if year_from is None else bisect_left(self.sorted_years, year_from)
+        end = len(self.sorted_years) if year_to is None else bisect_right(self.sorted_years, year_to)
+        flags = np.zeros(self.n, dtype=bool)
+        flags[self.year_order[start:end]] = True
+        return np.packbits(flags)
+
+    def mask(self, genre=None, year_from=None, year_to=None, language=None, adult=None):
+        """Boolean row mask of the movies passing every given filter, or None without filters"""
+        if genre is None and year_from is None and year_to is None and language is None and adult is None:
+            return None
+
+        bits = self.all_bits
+        if genre is not None:
+            key = GENRE_ALIASES.get(genre.casefold(), genre.casefold())
+            if key not in self.genre_bits:
+                raise ValueError(f"Unknown genre '{genre}'")
+            bits = bits & self.genre_bits[key]
+        if language is not None:
+            if language.lower() not in self.language_bits:
+                raise ValueError(f"Unknown language '{language}'")
+            bits = bits & self.language_bits[language.lower()]
+        if adult is not None:
+            bits = bits & (self.adult_bits if adult else ~self.adult_bits)
+        if year_from is not None or year_to is not None:
+            bits = bits & self.year_bits(year_from, year_to)
+        return np.unpackbits(bits, count=self.n).astype(bool)
+
+    def parse_mask(self, args):
+        """Mask for the filter query parameters of a request; raises ValueError on bad values"""
+        filters = {}
+        if args.get('genre'):
+            filters['genre'] = args['genre']
+        if args.get('language'):
+            filters['language'] = args['language']
+        if args.get('adult'):
+            filters['adult'] = parse_flag(args['adult'])
+        for name in ('year_from', 'year_to'):
+            if args.get(name):
+                filters[name] = int(args[name])
+        return self.mask(**filters)
@@ -5,6 +5,8 @@ from sklearn.neighbors import NearestNeighbors
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics.pairwise import cosine_similarity
 import joblib
+from movie_index import MovieIdIndex
+from feature_store import FEATURE_MATRIX_FORMAT, save_feature_matrix, stack_feature_blocks
 
 print("Loading preprocessed data...")
 processed_df = pd.read_csv('movies_preprocessed.csv', low_memory=False)
@@ -25,7 +27,10 @@ tfidf = TfidfVectorizer(
     min_df=2,  # Ignore terms that appear in less than 2 documents
     max_df=0.8  # Ignore terms that appear in more than 80% of documents
 )
-text_features = tfidf.fit_transform(text_data).toarray()
+text_features = tfidf.fit_transform(text_data)
+# Only densify when serving the classic dense matrix (FEATURE_MATRIX_FORMAT=sparse keeps CSR)
+if FEATURE_MATRIX_FORMAT == 'dense':
+    text_features = text_features.toarray()
 
 print(f"TF-IDF features shape: {text_features.shape}")
 
@@ -70,15 +75,15 @@ weighted_genres = genre_features * genre_weight
 weighted_languages = language_features * language_weight
 weighted_numerical = numerical_features_scaled * numerical_weight
 
-# Combine all features
-X = np.hstack([
+# Combine all features (CSR when FEATURE_MATRIX_FORMAT=sparse)
+X = stack_feature_blocks([
     weighted_text,
     weighted_genres, 
     weighted_languages,
     weighted_numerical
 ])
 
-print(f"Final feature matrix shape: {X.shape}")
+print(f"Final feature matrix shape: {X.shape} ({FEATURE_MATRIX_FORMAT})")
 
 # Use cosine similarity instead of euclidean distance for better results with mixed features
 # Increased to 11 neighbors (10 recommendations + 1 original movie to exclude)
@@ -90,12 +95,30 @@ joblib.dump(knn, 'improved_knn_model.joblib')
 joblib.dump(tfidf, 'improved_tfidf_vectorizer.joblib')
 joblib.dump(scaler, 'improved_scaler.joblib')
 
+# Save the feature matrix so the app can memory-map it instead of rebuilding it on every start
+feature_blocks = [
+    ('text', text_features.shape[1]),
+    ('genre', genre_features.shape[1]),
+    ('language', language_features.shape[1]),
+    ('numerical', numerical_features_scaled.shape[1])
+]
+feature_weights = {
+    'text': text_weight,
+    'genre': genre_weight,
+    'language': language_weight,
+    'numerical': numerical_weight
+}
+row_ids = MovieIdIndex(processed_df).ids
+feature_manifest = save_feature_matrix('improved_features', X, row_ids, feature_blocks,
+                                       'improved_tfidf_vectorizer.joblib', 'improved_scaler.joblib', feature_weights)
+print(f"Saved feature matrix artifact: {feature_manifest['matrix_file']}")
+
 print("✅ Improved models saved!")
 
 # Improved recommendation function
 def recommend_improved(movie_index, n_recommendations=10):
     """Get improved recommendations using cosine similarity"""
-    distances, indices = knn.kneighbors([X[movie_index]])
+    distances, indices = knn.kneighbors(X[movie_index:movie_index + 1])
     recommended_indices = indices[0][1:]  # Exclude the movie itself
     
     # Convert cosine distances to similarity scores (cosine distance = 1 - cosine similarity)
@@ -0,0 +1,235 @@
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+import scipy.sparse as sp
+from feature_store import row_norms
+
+# Extra float32 candidates re-ranked in float64 so the order matches sklearn
+DEFAULT_RERANK_MARGIN = 32
+
+NORMALIZE_BLOCK_ROWS = 4096
+# Seeds scored per matrix product in kneighbors_batch
+BATCH_BLOCK_ROWS = 256
+
+# Seeds whose candidate lists are kept for paging, and the list depth fetched at a time
+CANDIDATE_CACHE_SEEDS = 1024
+CANDIDATE_PAGE_DEPTH = 50
+
+# Filtered pages over-fetch the cached list by this factor over the estimated selectivity,
+# up to this depth; rarer filters run one masked search instead
+OVERFETCH_FACTOR = 2.0
+MAX_OVERFETCH_DEPTH = 2000
+
+def normalize_rows(X):
+    """(float64 row norms, float32 L2-normalized copy of X); zero rows stay zero like sklearn's normalize()"""
+    norms = row_norms(X)
+    safe_norms = np.where(norms == 0, 1.0, norms)
+    if sp.issparse(X):
+        return norms, (sp.diags(1.0 / safe_norms) @ X).astype(np.float32).tocsr()
+    # Normalized in row blocks so a memory-mapped X is never copied whole in float64
+    normalized = np.empty(X.shape, dtype=np.float32)
+    for start in range(0, X.shape[0], NORMALIZE_BLOCK_ROWS):
+        end = start + NORMALIZE_BLOCK_ROWS
+        normalized[start:end] = X[start:end] / safe_norms[start:end, None]
+    return norms, normalized
+
+class KNNEngine:
+    """Brute-force kNN over a fixed feature matrix: one float32 mat-vec plus argpartition per query"""
+
+    # Exact: a deeper search only extends a shallower one
+    approximate = False
+
+    def __init__(self, X, metric='cosine', n_neighbors=11, rerank_margin=DEFAULT_RERANK_MARGIN):
+        if metric not in ('cosine', 'euclidean'):
+            raise ValueError(f"Unsupported metric: {metric}")
+        self.X = X
+        self.metric = metric
+        self.n_neighbors = n_neighbors
+        self.rerank_margin = rerank_margin
+
+        # Row norms in float64 for the exact re-rank, float32 copies for the candidate scan
+        if metric == 'cosine':
+            self.norms, self.scan_matrix = normalize_rows(X)
+        else:
+            self.norms = row_norms(X)
+            self.scan_matrix = X.astype(np.float32).tocsr() if sp.issparse(X) else np.asarray(X, dtype=np.float32)
+            self.squared_norms = (self.norms ** 2).astype(np.float32)
+
+    @classmethod
+    def from_model(cls, knn_model, X, rerank_margin=DEFAULT_RERANK_MARGIN):
+        """Engine with the metric and neighbor count of a fitted NearestNeighbors model"""
+        return cls(X, metric=knn_model.effective_metric_, n_neighbors=knn_model.n_neighbors,
+                   rerank_margin=rerank_margin)
+
+    def __len__(self):
+        return self.X.shape[0]
+
+    def _row(self, matrix, positions):
+        """Dense float64 rows of a dense or CSR matrix"""
+        rows = matrix[positions]
+        return rows.toarray() if sp.issparse(rows) else np.asarray(rows, dtype=np.float64)
+
+    def _scan_scores(self, queries):
+        """float32 scan scores (lower is closer) of every row, one score row per query"""
+        queries32 = queries.astype(np.float32)
+        if self.metric == 'cosine':
+            norms = np.linalg.norm(queries32, axis=1, keepdims=True)
+            products = self.scan_matrix @ (queries32 / np.where(norms == 0, 1, norms)).T
+            return -np.asarray(products).T
+        # |x - q|^2 without the constant |q|^2 term
+        return self.squared_norms[None, :] - 2 * np.asarray(self.scan_matrix @ queries32.T).T
+
+    def _candidates(self, scores, n_candidates):
+        """Positions of the n_candidates best rows of one score row"""
+        if n_candidates >= len(scores):
+            return np.arange(len(scores))
+        return np.argpartition(scores, n_candidates - 1)[:n_candidates]
+
+    def _exact_distances(self, query, candidates):
+        """float64 distances computed the way sklearn does"""
+        rows = self._row(self.X, candidates)
+        if self.metric == 'cosine':
+            norm = np.linalg.norm(query)
+            query = query / norm if norm else query
+            safe_norms = np.where(self.norms[candidates] == 0, 1.0, self.norms[candidates])
+            distances = 1.0 - (rows / safe_norms[:, None]) @ query
+            return np.clip(distances, 0, 2)
+        return np.sqrt(np.maximum(((rows - query) ** 2).sum(axis=1), 0))
+
+    def _rerank(self, query, candidates, n_neighbors):
+        """Exact (distances, indices) of the n_neighbors closest candidates"""
+        distances = self._exact_distances(query, candidates)
+        # Ties are broken by row position so results are deterministic
+        order = np.lexsort((candidates, distances))[:n_neighbors]
+        return distances[order], candidates[order]
+
+    def query(self, vector, n_neighbors=None, allowed=None):
+        """(distances, indices) of the nearest rows to a feature vector, closest first (only rows set in `allowed`)"""
+        n_neighbors = min(n_neighbors or self.n_neighbors, len(self))
+        query = np.asarray(vector.toarray() if sp.issparse(vector) else vector, dtype=np.float64).ravel()
+
+        scores = self._scan_scores(query[None, :])[0]
+        if allowed is not None:
+            # Masked inside the scan, so k allowed rows come back whenever k exist
+            scores = np.where(allowed, scores, np.inf)
+        candidates = self._candidates(scores, n_neighbors + self.rerank_margin)
+        if allowed is not None:
+            candidates = candidates[allowed[candidates]]
+        return self._rerank(query, candidates, n_neighbors)
+
+    def profile(self, positions, weights=None):
+        """Weighted mean of catalog rows (unit-normalized first for cosine), usable as one query vector"""
+        rows = self._row(self.X, positions)
+        if self.metric == 'cosine':
+            rows = rows / np.where(self.norms[positions] == 0, 1.0, self.norms[positions])[:, None]
+        weights = np.ones(len(rows)) if weights is None else np.asarray(weights, dtype=np.float64)
+        return weights @ rows / weights.sum()
+
+    def kneighbors(self, position, n_neighbors=None, allowed=None):
+        """Neighbors of a catalog row, the row itself included (like knn_model.kneighbors)"""
+        return self.query(self._row(self.X, [position])[0], n_neighbors, allowed)
+
+    def kneighbors_batch(self, positions, n_neighbors=None):
+        """kneighbors for many catalog rows, scanned with one matrix product per block of rows"""
+        n_neighbors = min(n_neighbors or self.n_neighbors, len(self))
+        results = []
+        for start in range(0, len(positions), BATCH_BLOCK_ROWS):
+            queries = self._row(self.X, positions[start:start + BATCH_BLOCK_ROWS])
+            block_scores = self._scan_scores(queries)
+            for query, scores in zip(queries, block_scores):
+                candidates = self._candidates(scores, n_neighbors + self.rerank_margin)
+                results.append(self._rerank(query, candidates, n_neighbors))
+        return results
+
+def exclude_position(distances, indices, position, n_neighbors):
+    """Drop the seed row from a neighbor list and keep the first n_neighbors"""
+    keep = indices != position
+    return distances[keep][:n_neighbors], indices[keep][:n_neighbors]
+
+def mask_key(allowed):
+    """Short digest of a boolean row mask, for caching lists per filter"""
+    return hashlib.blake2b(np.packbits(allowed).tobytes(), digest_size=16).digest()
+
+class CandidateCache:
+    """Per-seed LRU cache of sorted neighbor lists, deepened on demand for "show more" pages"""
+
+    def __init__(self, engine, max_seeds=CANDIDATE_CACHE_SEEDS, page_depth=CANDIDATE_PAGE_DEPTH):
+        self.engine = engine
+        self.max_seeds = max_seeds
+        self.page_depth = page_depth
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def neighbors(self, position, depth, allowed=None):
+        """(distances, indices) of the `depth` closest other movies for a seed row, optionally within a row mask"""
+        if allowed is not None and self.engine.approximate:
+            # An approximate ranking shifts as more of the index is searched, so filtered lists come
+            # from masked searches cached per seed and mask, and pages never repeat or skip rows
+            entry = self._entry((position, mask_key(allowed)), position, depth, allowed)
+            return entry[0][:depth], entry[1][:depth]
+
+        entry = self._entry(position, position, depth)
+        if allowed is None:
+            return entry[0][:depth], entry[1][:depth]
+
+        valid = allowed[entry[1]]
+        if valid.sum() < depth and not entry[2]:
+            # Over-fetch the cached list adaptively from the selectivity seen so far
+            selectivity = max(valid.mean(), 1.0 / len(valid)) if len(valid) else allowed.mean()
+            wanted = int(depth / max(selectivity, 1e-9) * OVERFETCH_FACTOR)
+            if wanted <= MAX_OVERFETCH_DEPTH:
+                entry = self._fetch(position, position, wanted, entry)
+                valid = allowed[entry[1]]
+            if valid.sum() < depth and not entry[2]:
+                # Too selective for the cached list: one scan with the mask applied
+                distances, indices = self.engine.kneighbors(position, depth + 1, allowed=allowed)
+                return exclude_position(distances, indices, position, depth)
+        return entry[0][valid][:depth], entry[1][valid][:depth]
+
+    def _entry(self, key, position, depth, allowed=None):
+        """Cached list for a key, fetched or deepened when it is shorter than `depth`"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+        if entry is None or (len(entry[1]) < depth and not entry[2]):
+            return self._fetch(key, position, depth, entry, allowed)
+        self.hits += 1
+        return entry
+
+    def _fetch(self, key, position, depth, entry, allowed=None):
+        """Search `depth` deep (whole pages, at least double the cached depth) and cache the list"""
+        self.misses += 1
+        cached_depth = len(entry[1]) if entry is not None else 0
+        fetch_depth = max(depth, 2 * cached_depth)
+        fetch_depth = -(-fetch_depth // self.page_depth) * self.page_depth
+        distances, indices = self.engine.kneighbors(position, fetch_depth + 1, allowed=allowed)
+        distances, indices = exclude_position(distances, indices, position, fetch_depth)
+        if entry is not None:
+            # Keep the pages already served: a deeper approximate search may rank new rows
+            # ahead of cached ones, which must then follow the cached list instead
+            new = ~np.isin(indices, entry[1])
+            distances = np.concatenate([entry[0], distances[new]])[:fetch_depth]
+            indices = np.concatenate([entry[1], indices[new]])[:fetch_depth]
+        # Only a search asking for every other (allowed) row has ranked all of them; an
+        # approximate engine may return a short list for a shallower search
+        if allowed is None:
+            others = len(self.engine) - 1
+        else:
+            others = int(allowed.sum()) - int(allowed[position])
+        entry = (distances, indices, fetch_depth >= others)
+
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_seeds:
+                self.entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        """Forget every cached list, e.g. after the catalog or engine changes"""
+        with self.lock:
+            self.entries.clear()
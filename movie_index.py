@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+
+class MovieIdIndex:
+    """Lookup table from TMDB movie id to row position in the movies DataFrame"""
+
+    def __init__(self, movies_df):
+        # Parse ids the same way the endpoints always have: int(float(str(id)))
+        parsed = pd.to_numeric(movies_df['id'].astype(str), errors='coerce').to_numpy(dtype=np.float64)
+        # Negative ids are the catalog snapshot's marker for malformed ids
+        valid = np.isfinite(parsed) & (parsed >= 0)
+
+        # Malformed ids (dates, blanks, NaN) can never be requested, mark them with -1
+        self.ids = np.full(len(movies_df), -1, dtype=np.int64)
+        self.ids[valid] = np.trunc(parsed[valid]).astype(np.int64)
+        self.valid_positions = np.flatnonzero(valid)
+
+        # Duplicate ids resolve to their first row, like the old top-to-bottom scan
+        valid_ids = self.ids[self.valid_positions]
+        first_seen = ~pd.Series(valid_ids).duplicated(keep='first').to_numpy()
+        self.positions = dict(zip(valid_ids[first_seen].tolist(), self.valid_positions[first_seen].tolist()))
+
+        self.malformed_count = int(len(movies_df) - len(self.valid_positions))
+        self.duplicate_count = int(len(valid_ids) - first_seen.sum())
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __contains__(self, movie_id):
+        return movie_id in self.positions
+
+    def position(self, movie_id):
+        """Return the row position for a movie id, or None if unknown"""
+        return self.positions.get(movie_id)
+
+    def movie_id(self, position):
+        """Return the movie id stored at a row position, or None if malformed"""
+        movie_id = int(self.ids[position])
+        return movie_id if movie_id >= 0 else None
+
+    def random_id(self, limit=1000):
+        """Pick a random valid movie id from the first `limit` rows"""
+        candidates = self.valid_positions[self.valid_positions < limit]
+        if len(candidates) == 0:
+            candidates = self.valid_positions
+        return int(self.ids[np.random.choice(candidates)])
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Precompute the top-K cosine neighbors of every movie from a saved feature
+matrix artifact, so /api/recommend/<id> becomes a table lookup.
+
+Usage: python neighbor_table.py [feature_prefix] [k]
+       (defaults: improved_features_10, 50)
+"""
+
+import json
+import os
+import sys
+import time
+import numpy as np
+import scipy.sparse as sp
+from feature_store import atomic_write, read_feature_matrix, row_norms
+
+# Bump whenever the layout of the saved neighbor table changes
+NEIGHBOR_TABLE_VERSION = 1
+
+# Neighbors stored per movie: deeper than the 10 served, so filtered requests are answered
+# from the same row instead of falling back to a masked kNN scan
+NEIGHBOR_TABLE_DEPTH = 50
+
+# Rows per matrix multiply: a block of similarities is block_size x n_movies float64
+DEFAULT_BLOCK_SIZE = 256
+
+# Manifest keys that define the feature space the neighbors were computed in
+FEATURE_SPACE_KEYS = ('vectorizer_sha256', 'scaler_sha256', 'weights', 'blocks')
+
+def table_paths(prefix):
+    """Index, score, row id and manifest file names for a feature artifact prefix"""
+    return (f"{prefix}_neighbors.npy", f"{prefix}_neighbor_scores.npy",
+            f"{prefix}_neighbor_ids.npy", f"{prefix}_neighbors.json")
+
+def compute_neighbor_table(X, k, block_size=DEFAULT_BLOCK_SIZE):
+    """Top-k cosine neighbors (excluding the movie itself) via blocked matrix multiplies"""
+    n_rows = X.shape[0]
+    k = min(k, n_rows - 1)
+    # Zero rows get norm 1 so they stay zero (similarity 0)
+    norms = row_norms(X)
+    norms[norms == 0] = 1.0
+    X_T = X.T.tocsr() if sp.issparse(X) else X.T
+
+    indices = np.empty((n_rows, k), dtype=np.int32)
+    scores = np.empty((n_rows, k), dtype=np.float16)
+    for start in range(0, n_rows, block_size):
+        end = min(start + block_size, n_rows)
+        block = X[start:end] @ X_T
+        similarities = block.toarray() if sp.issparse(block) else np.asarray(block, dtype=np.float64)
+        similarities /= norms[start:end, None]
+        similarities /= norms[None, :]
+
+        # A movie is never its own recommendation
+        rows = np.arange(end - start)
+        similarities[rows, rows + start] = -np.inf
+
+        candidates = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        # Sort by similarity, ties broken by row position so the table is deterministic
+        candidates.sort(axis=1)
+        candidate_scores = np.take_along_axis(similarities, candidates, axis=1)
+        order = np.argsort(-candidate_scores, axis=1, kind='stable')
+        indices[start:end] = np.take_along_axis(candidates, order, axis=1)
+        scores[start:end] = np.take_along_axis(candidate_scores, order, axis=1)
+    return indices, scores
+
+def save_neighbor_table(prefix, indices, scores, row_ids, feature_manifest):
+    """Write the neighbor arrays and a manifest tying them to the feature space"""
+    indices_path, scores_path, ids_path, manifest_path = table_paths(prefix)
+    manifest = {
+        'version': NEIGHBOR_TABLE_VERSION,
+        'metric': 'cosine',
+        'k': int(indices.shape[1]),
+        'rows': int(indices.shape[0]),
+        'n_features': int(feature_manifest['shape'][1]),
+        'feature_space': {key: feature_manifest.get(key) for key in FEATURE_SPACE_KEYS},
+        'indices_file': indices_path,
+        'scores_file': scores_path,
+        'ids_file': ids_path
+    }
+
+    # Write to per-process temp files and rename, so a concurrent reader never sees half a
+    # table and concurrent writers never interleave; the manifest goes last
+    for path, array in ((indices_path, indices), (scores_path, scores),
+                        (ids_path, np.asarray(row_ids, dtype=np.int64))):
+        with atomic_write(path) as f:
+            np.save(f, array)
+    with atomic_write(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+def build_neighbor_table(prefix, X, row_ids, feature_manifest, k, block_size=DEFAULT_BLOCK_SIZE):
+    """Compute and save the neighbor table for a feature matrix"""
+    start = time.perf_counter()
+    indices, scores = compute_neighbor_table(X, k, block_size)
+    manifest = save_neighbor_table(prefix, indices, scores, row_ids, feature_manifest)
+    print(f"✅ Neighbor table {indices.shape} written to {manifest['indices_file']} "
+          f"in {time.perf_counter() - start:.1f}s")
+    return manifest
+
+class NeighborTable:
+    """Memory-mapped top-K neighbors, looked up by row position"""
+
+    def __init__(self, indices, scores, manifest):
+        self.indices = indices
+        self.scores = scores
+        self.manifest = manifest
+        self.k = manifest['k']
+
+    def __len__(self):
+        return self.indices.shape[0]
+
+    def lookup(self, position, k=None):
+        """(neighbor positions, similarities) for a row, or None if the row is not in the table"""
+        k = self.k if k is None else k
+        if position >= len(self) or k > self.k:
+            return None
+        return self.indices[position, :k], self.scores[position, :k].astype(np.float64)
+
+def load_neighbor_table(prefix, row_ids, feature_manifest, min_k):
+    """Memory-map a neighbor table, or return None if it is missing or stale"""
+    indices_path, scores_path, ids_path, manifest_path = table_paths(prefix)
+    if feature_manifest is None or not os.path.exists(manifest_path):
+        return None
+
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+        row_ids = np.asarray(row_ids, dtype=np.int64)
+        stale_reason = None
+        if manifest.get('version') != NEIGHBOR_TABLE_VERSION:
+            stale_reason = "table format changed"
+        elif manifest.get('k', 0) < min_k:
+            stale_reason = f"holds {manifest.get('k')} neighbors, {min_k} needed"
+        elif (manifest.get('n_features') != feature_manifest['shape'][1] or
+              manifest.get('feature_space') != {key: feature_manifest.get(key) for key in FEATURE_SPACE_KEYS}):
+            stale_reason = "feature space changed"
+        elif manifest.get('rows', 0) > len(row_ids):
+            stale_reason = "movie rows removed"
+        # Movies appended after the build are fine: they fall back to the on-line kNN
+        elif not np.array_equal(np.load(ids_path), row_ids[:manifest['rows']]):
+            stale_reason = "movie rows changed"
+
+        if stale_reason:
+            print(f"Neighbor table {indices_path} is stale ({stale_reason})")
+            return None
+
+        indices = np.load(indices_path, mmap_mode='r')
+        scores = np.load(scores_path, mmap_mode='r')
+        if indices.shape != (manifest['rows'], manifest['k']) or scores.shape != indices.shape:
+            print(f"Neighbor table {indices_path} has the wrong shape")
+            return None
+        return NeighborTable(indices, scores, manifest)
+
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Could not read neighbor table {indices_path}: {e}")
+        return None
+
+if __name__ == '__main__':
+    feature_prefix = sys.argv[1] if len(sys.argv) > 1 else 'improved_features_10'
+    k = int(sys.argv[2]) if len(sys.argv) > 2 else NEIGHBOR_TABLE_DEPTH
+
+    print(f"📊 Loading feature matrix artifact {feature_prefix}...")
+    X, row_ids, feature_manifest = read_feature_matrix(feature_prefix)
+    print(f"✅ Loaded feature matrix {X.shape}")
+    build_neighbor_table(feature_prefix, X, row_ids, feature_manifest, k)
@@ -0,0 +1,243 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import Response, make_response, request
+from feature_store import file_sha256
+from serialization import negotiated_encoding, negotiated_format
+
+# Bounds of the in-process response cache
+RESPONSE_CACHE_ENTRIES = 4096
+RESPONSE_CACHE_BYTES = 64 * 1024 * 1024
+
+# Rows kept in the shared on-disk tier; the oldest are pruned every PRUNE_INTERVAL writes
+SHARED_CACHE_ENTRIES = 100000
+SHARED_CACHE_PRUNE_INTERVAL = 1000
+# Seconds a shared row is kept; rows of retired artifact versions stop being rewritten and age out
+SHARED_CACHE_MAX_AGE = 24 * 3600
+# Milliseconds a writer waits for another worker's write lock before giving up
+SHARED_CACHE_BUSY_TIMEOUT = 2000
+
+# Clients keep responses but revalidate them with If-None-Match on every use
+CONDITIONAL_CACHE_CONTROL = 'public, no-cache'
+
+def artifact_version(paths):
+    """Short hash of the contents of every model/data artifact, the same for every worker and host"""
+    digest = hashlib.sha256()
+    for path in paths:
+        # Only the file name: the same artifacts may live in different directories on different hosts
+        digest.update(os.path.basename(path).encode())
+        if os.path.exists(path):
+            digest.update(file_sha256(path).encode())
+    return digest.hexdigest()[:16]
+
+def request_key(view, args, kwargs, version=None):
+    """Cache key of a view call: view name, URL arguments, query parameters, body format and model version"""
+    return (view.__name__, args, tuple(sorted(kwargs.items())), tuple(sorted(request.args.items(multi=True))),
+            negotiated_format(), version)
+
+def make_etag(version, key):
+    """Strong ETag for a response that only changes with the artifact version"""
+    return hashlib.sha256(f"{version}|{key!r}".encode()).hexdigest()[:32]
+
+def conditional(version_fn):
+    """Decorator adding an ETag to 200 responses and answering a matching If-None-Match with 304 before the view runs"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # Each content coding is a different representation, so it gets its own strong tag
+            version = version_fn()
+            etag = make_etag(version, (request_key(view, args, kwargs, version), negotiated_encoding()))
+            if etag in request.if_none_match:
+                response = Response(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = CONDITIONAL_CACHE_CONTROL
+            return response
+        return wrapper
+    return decorator
+
+class SharedResponseCache:
+    """Response bodies shared by every worker process through one SQLite file in WAL mode"""
+
+    def __init__(self, path, version, max_entries=SHARED_CACHE_ENTRIES, max_age=SHARED_CACHE_MAX_AGE):
+        self.path = path
+        # Version of this worker's models, reported in stats; workers mid-reload or mid-rollout
+        # may run other versions, so pruning never looks at it
+        self.version = version
+        self.max_entries = max_entries
+        self.max_age = max_age
+        # sqlite3 connections cannot be shared between threads
+        self.local = threading.local()
+        self.writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("""CREATE TABLE IF NOT EXISTS responses (
+                                  key TEXT NOT NULL,
+                                  version TEXT NOT NULL,
+                                  body BLOB NOT NULL,
+                                  mimetype TEXT NOT NULL,
+                                  created REAL NOT NULL,
+                                  PRIMARY KEY (key, version))""")
+        connection.execute("CREATE INDEX IF NOT EXISTS responses_created ON responses (created)")
+        connection.commit()
+
+    def _connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=SHARED_CACHE_BUSY_TIMEOUT / 1000)
+            connection.execute(f"PRAGMA busy_timeout={SHARED_CACHE_BUSY_TIMEOUT}")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.local.connection = connection
+        return connection
+
+    def get(self, key, version):
+        """Cached (body, mimetype) computed by any worker for an artifact version, or None"""
+        try:
+            row = self._connection().execute("SELECT body, mimetype FROM responses WHERE key = ? AND version = ?",
+                                             (key, version)).fetchone()
+        except sqlite3.Error as e:
+            self.errors += 1
+            print(f"Shared cache read failed: {e}")
+            return None
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return bytes(row[0]), row[1]
+
+    def put(self, key, body, mimetype, version):
+        """Store a response body computed with an artifact version; concurrent writers are serialized by SQLite's write lock"""
+        try:
+            connection = self._connection()
+            with connection:
+                connection.execute("INSERT OR REPLACE INTO responses (key, version, body, mimetype, created) VALUES (?, ?, ?, ?, ?)",
+                                   (key, version, sqlite3.Binary(body), mimetype, time.time()))
+            self.writes += 1
+            if self.writes % SHARED_CACHE_PRUNE_INTERVAL == 0:
+                self.prune()
+        except sqlite3.Error as e:
+            self.errors += 1
+            print(f"Shared cache write failed: {e}")
+
+    def prune(self):
+        """Drop rows older than max_age and the oldest rows beyond max_entries, whatever their version"""
+        connection = self._connection()
+        with connection:
+            connection.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.max_age,))
+            connection.execute("""DELETE FROM responses WHERE rowid IN (
+                                      SELECT rowid FROM responses ORDER BY created DESC LIMIT -1 OFFSET ?)""",
+                               (self.max_entries,))
+
+    def stats(self):
+        """Counters of this worker's lookups in the shared tier"""
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "version": self.version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+class ResponseCache:
+    """LRU cache of successful JSON response bodies, bounded by entry count and total bytes"""
+
+    def __init__(self, max_entries=RESPONSE_CACHE_ENTRIES, max_bytes=RESPONSE_CACHE_BYTES, shared=None, version_fn=None):
+        # Optional SharedResponseCache consulted on local misses
+        self.shared = shared
+        # Version of the models answering the current request, part of every key
+        self.version_fn = version_fn or (lambda: None)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """Cached (body, mimetype) for a key, or None"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, body, mimetype):
+        """Store a response body, evicting least recently used entries to stay within bounds"""
+        if len(body) > self.max_bytes:
+            return
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.size_bytes -= len(previous[0])
+            self.entries[key] = (body, mimetype)
+            self.size_bytes += len(body)
+            while len(self.entries) > self.max_entries or self.size_bytes > self.max_bytes:
+                _, (evicted_body, _) = self.entries.popitem(last=False)
+                self.size_bytes -= len(evicted_body)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every entry, e.g. after the models are reloaded"""
+        with self.lock:
+            self.entries.clear()
+            self.size_bytes = 0
+
+    def stats(self):
+        """Counters for sizing the cache"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "bytes": self.size_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def cached(self, view):
+        """Decorator caching a view's 200 responses, keyed by view, arguments and query parameters"""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            version = self.version_fn()
+            key = request_key(view, args, kwargs, version)
+            entry = self.get(key)
+            if entry is None and self.shared is not None:
+                # Another worker may already have computed this response
+                entry = self.shared.get(repr(key), version)
+                if entry is not None:
+                    self.put(key, *entry)
+            if entry is not None:
+                return Response(entry[0], mimetype=entry[1])
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                body = response.get_data()
+                self.put(key, body, response.mimetype)
+                if self.shared is not None:
+                    self.shared.put(repr(key), body, response.mimetype, version)
+            return response
+        return wrapper
@@ -5,6 +5,9 @@ from sklearn.neighbors import NearestNeighbors
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics.pairwise import cosine_similarity
 import joblib
+from movie_index import MovieIdIndex
+from feature_store import FEATURE_MATRIX_FORMAT, save_feature_matrix, stack_feature_blocks
+from neighbor_table import NEIGHBOR_TABLE_DEPTH, build_neighbor_table
 
 print("🔄 Retraining improved model with 10 recommendations...")
 print("Loading preprocessed data...")
@@ -26,7 +29,10 @@ tfidf = TfidfVectorizer(
     min_df=2,  # Ignore terms that appear in less than 2 documents
     max_df=0.8  # Ignore terms that appear in more than 80% of documents
 )
-text_features = tfidf.fit_transform(text_data).toarray()
+text_features = tfidf.fit_transform(text_data)
+# Only densify when serving the classic dense matrix (FEATURE_MATRIX_FORMAT=sparse keeps CSR)
+if FEATURE_MATRIX_FORMAT == 'dense':
+    text_features = text_features.toarray()
 
 print(f"TF-IDF features shape: {text_features.shape}")
 
@@ -71,15 +77,15 @@ weighted_genres = genre_features * genre_weight
 weighted_languages = language_features * language_weight
 weighted_numerical = numerical_features_scaled * numerical_weight
 
-# Combine all features
-X = np.hstack([
+# Combine all features (CSR when FEATURE_MATRIX_FORMAT=sparse)
+X = stack_feature_blocks([
     weighted_text,
     weighted_genres, 
     weighted_languages,
     weighted_numerical
 ])
 
-print(f"Final feature matrix shape: {X.shape}")
+print(f"Final feature matrix shape: {X.shape} ({FEATURE_MATRIX_FORMAT})")
 
 # Use cosine similarity with 11 neighbors (10 recommendations + 1 original movie to exclude)
 print("Training KNN model with 11 neighbors for 10 recommendations...")
@@ -91,6 +97,28 @@ joblib.dump(knn, 'improved_knn_model_10.joblib')
 joblib.dump(tfidf, 'improved_tfidf_vectorizer_10.joblib')
 joblib.dump(scaler, 'improved_scaler_10.joblib')
 
+# Save the feature matrix so the app can memory-map it instead of rebuilding it on every start
+feature_blocks = [
+    ('text', text_features.shape[1]),
+    ('genre', genre_features.shape[1]),
+    ('language', language_features.shape[1]),
+    ('numerical', numerical_features_scaled.shape[1])
+]
+feature_weights = {
+    'text': text_weight,
+    'genre': genre_weight,
+    'language': language_weight,
+    'numerical': numerical_weight
+}
+row_ids = MovieIdIndex(processed_df).ids
+feature_manifest = save_feature_matrix('improved_features_10', X, row_ids, feature_blocks,
+                                       'improved_tfidf_vectorizer_10.joblib', 'improved_scaler_10.joblib', feature_weights)
+print(f"Saved feature matrix artifact: {feature_manifest['matrix_file']}")
+
+# Precompute the 50 nearest neighbors of every movie; the app serves the first 10 by lookup
+# and filters the rest for constrained requests
+build_neighbor_table('improved_features_10', X, row_ids, feature_manifest, k=NEIGHBOR_TABLE_DEPTH)
+
 print("✅ Improved models with 10 recommendations saved!")
 
 # Test with Toy Story to show 10 recommendations
@@ -110,7 +138,7 @@ if toy_story_idx is not None:
     print(f"Genres: {[col for col in available_genres if processed_df.iloc[toy_story_idx][col] == 1]}")
     
     # Get 10 recommendations
-    distances, indices = knn.kneighbors([X[toy_story_idx]])
+    distances, indices = knn.kneighbors(X[toy_story_idx:toy_story_idx + 1])
     recommended_indices = indices[0][1:]  # Exclude the movie itself (now 10 recommendations)
     similarities = 1 - distances[0][1:]  # Convert distances to similarities
     
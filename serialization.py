@@ -0,0 +1,98 @@
+import gzip
+import json
+import numpy as np
+from flask import has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+
+# Both are in requirements.txt; the fallbacks only keep a broken install serving
+try:
+    import orjson
+except ImportError:
+    orjson = None
+    print("orjson not installed, encoding JSON with the json module (pip install -r requirements.txt)")
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+    print("msgpack not installed, Accept: application/msgpack gets JSON (pip install -r requirements.txt)")
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+JSON_MIMETYPE = 'application/json'
+MSGPACK_MIMETYPE = 'application/msgpack'
+# Older clients still ask for the unregistered name
+MSGPACK_MIMETYPES = (MSGPACK_MIMETYPE, 'application/x-msgpack')
+
+# Bodies smaller than this are sent uncompressed; headers and CPU would outweigh the savings
+COMPRESSION_THRESHOLD = 1024
+GZIP_LEVEL = 6
+# Brotli quality 5 compresses JSON better than gzip -6 at a similar cost; 11 is far too slow per request
+BROTLI_QUALITY = 5
+
+def numpy_default(value):
+    """Plain Python value for numpy scalars and arrays, for encoders without native numpy support"""
+    if isinstance(value, (np.generic, np.ndarray)):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not serializable")
+
+def encode_json(obj):
+    """Compact JSON bytes with sorted keys, like jsonify, via orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=numpy_default,
+                            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=numpy_default, sort_keys=True, separators=(',', ':')).encode()
+
+def encode_msgpack(obj):
+    """MessagePack bytes of a JSON-like payload"""
+    return msgpack.packb(obj, default=numpy_default)
+
+def negotiated_format():
+    """'msgpack' when the request prefers it over JSON and msgpack is installed, else 'json'"""
+    if msgpack is None or not has_request_context():
+        return 'json'
+    best = request.accept_mimetypes.best_match((JSON_MIMETYPE,) + MSGPACK_MIMETYPES, default=JSON_MIMETYPE)
+    return 'msgpack' if best in MSGPACK_MIMETYPES else 'json'
+
+def negotiated_encoding():
+    """Best content coding the client accepts ('br' or 'gzip'), or None for identity"""
+    available = ('br', 'gzip') if brotli is not None else ('gzip',)
+    return request.accept_encodings.best_match(available)
+
+def compress(body, encoding):
+    """Body compressed with 'br' or 'gzip'"""
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+class FastJSONProvider(DefaultJSONProvider):
+    """jsonify() through orjson (numpy values included), answering msgpack when the Accept header asks for it"""
+
+    def dumps(self, obj, **kwargs):
+        return encode_json(obj).decode()
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if negotiated_format() == 'msgpack':
+            return self._app.response_class(encode_msgpack(obj), mimetype=MSGPACK_MIMETYPE)
+        return self._app.response_class(encode_json(obj), mimetype=JSON_MIMETYPE)
+
+def compress_response(response):
+    """after_request hook: gzip or brotli for successful API bodies above COMPRESSION_THRESHOLD"""
+    if (response.status_code != 200 or response.direct_passthrough or 'Content-Encoding' in response.headers
+            or response.mimetype not in (JSON_MIMETYPE, MSGPACK_MIMETYPE)):
+        return response
+    # Caches must not hand a msgpack or compressed body to a client that did not ask for it
+    response.vary.add('Accept')
+    response.vary.add('Accept-Encoding')
+
+    body = response.get_data()
+    encoding = negotiated_encoding()
+    if encoding is None or len(body) < COMPRESSION_THRESHOLD:
+        return response
+    response.set_data(compress(body, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
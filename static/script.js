@@ -11,7 +11,8 @@ const DEFAULT_POSTER = 'https://via.placeholder.com/300x450/1a1a2e/ffffff?text=N
 // Load movies from backend on page load
 async function loadMovies() {
     try {
-        const response = await fetch(`${API_BASE_URL}/movies`);
+        // Only the fields the grid and the offline search fallback use
+        const response = await fetch(`${API_BASE_URL}/movies?fields=title,img,year,genre`);
         if (!response.ok) {
             throw new Error(`HTTP error! status: ${response.status}`);
         }
@@ -269,16 +270,12 @@ async function performSearch() {
     }
 
     try {
-        // Search using backend API
-        const response = await fetch(`${API_BASE_URL}/search?q=${encodeURIComponent(searchTerm)}`);
+        // Search using backend API (typo tolerant, exact matches first); the genre filter runs on the server
+        const genreParam = filterGenre !== 'all' ? `&genre=${encodeURIComponent(filterGenre)}` : '';
+        const response = await fetch(`${API_BASE_URL}/search?q=${encodeURIComponent(searchTerm)}&fuzzy=1${genreParam}&fields=title,img,year`);
         const data = await response.json();
         let filteredMovies = data.movies || [];
 
-        // Apply genre filter if needed
-        if (filterGenre !== 'all') {
-            filteredMovies = filteredMovies.filter(movie => movie.genre === filterGenre);
-        }
-
         if (filteredMovies.length === 0) {
             resultsSection.style.display = 'none';
             noResultsSection.style.display = 'block';
@@ -0,0 +1,50 @@
+import requests
+import json
+
+# Test the batch recommendation API endpoint
+base_url = "http://localhost:5000"
+
+def test_batch_recommendations():
+    print("🎬 Testing Batch Recommendation API")
+    print("=" * 40)
+
+    # Use the first few movies from the catalog as seeds
+    print("1. Getting seed movies...")
+    movies_response = requests.get(f"{base_url}/api/movies")
+    seeds = [movie['id'] for movie in movies_response.json().get('movies', [])[:5]]
+    print(f"   Seeds: {seeds}")
+
+    # Add an unknown id, it should be reported without failing the batch
+    movie_ids = seeds + [999999999]
+    print(f"\n2. Requesting recommendations for {len(movie_ids)} movies in one call...")
+    batch_response = requests.post(f"{base_url}/api/recommend/batch", json={"movie_ids": movie_ids})
+
+    if batch_response.status_code == 200:
+        results = batch_response.json().get('results', [])
+        print(f"✅ Got {len(results)} results:")
+        for result in results:
+            if 'error' in result:
+                print(f"   {result['movie_id']}: {result['error']}")
+            else:
+                print(f"   {result['movie']['title']}: {len(result['recommendations'])} recommendations")
+
+        # Batch results should match the single-movie endpoint
+        print(f"\n3. Comparing with /api/recommend/{seeds[0]}...")
+        single = requests.get(f"{base_url}/api/recommend/{seeds[0]}").json()
+        single_ids = [rec['id'] for rec in single.get('recommendations', [])]
+        batch_ids = [rec['id'] for rec in results[0].get('recommendations', [])]
+        if single_ids == batch_ids:
+            print("✅ Batch and single recommendations match!")
+        else:
+            print(f"❌ Mismatch: {single_ids} vs {batch_ids}")
+    else:
+        print(f"❌ Batch request failed: {batch_response.status_code}")
+
+if __name__ == "__main__":
+    try:
+        test_batch_recommendations()
+        print("\n🎉 Batch recommendation testing complete!")
+    except requests.exceptions.ConnectionError:
+        print("❌ Could not connect to the server. Make sure it's running on http://localhost:5000")
+    except Exception as e:
+        print(f"❌ Test failed: {e}")
@@ -0,0 +1,89 @@
+import requests
+
+# Test "show more" paging of /api/recommend; run it against both the exact engine
+# and the IVF index (start app.py with ANN_N_PROBE=4) to cover shallow probes and filters
+base_url = "http://localhost:5000"
+
+PAGE_SIZE = 50
+# MAX_RECOMMENDATION_DEPTH in app.py
+MAX_DEPTH = 1000
+
+def fetch_all_pages(movie_id, params=""):
+    """Every page of recommendations for a movie, following next_cursor"""
+    pages = []
+    cursor = None
+    while True:
+        url = f"{base_url}/api/recommend/{movie_id}?k={PAGE_SIZE}{params}"
+        if cursor is not None:
+            url += f"&cursor={cursor}"
+        data = requests.get(url).json()
+        pages.append(data.get('recommendations', []))
+        cursor = data.get('next_cursor')
+        if cursor is None:
+            return pages
+
+def page_problems(pages):
+    """Descriptions of pages that are short although next_cursor was set, or that repeat recommendations"""
+    problems = []
+    short_pages = [i for i, page in enumerate(pages[:-1]) if len(page) != PAGE_SIZE]
+    if short_pages:
+        problems.append(f"pages {short_pages} are short although next_cursor was set")
+    # Duplicate catalog rows share id and score, so only a repeat across pages is an overlap
+    seen = {}
+    overlaps = [rec['id'] for i, page in enumerate(pages) for rec in page
+                if seen.setdefault((rec['id'], rec['similarity_score']), i) != i]
+    if overlaps:
+        problems.append(f"pages repeat recommendations {overlaps[:10]}")
+    return problems
+
+def test_paging():
+    print("🎬 Testing Recommendation Paging")
+    print("=" * 40)
+
+    seed = requests.get(f"{base_url}/api/movies").json()['movies'][0]
+    print(f"1. Paging through recommendations for '{seed['title']}' ({PAGE_SIZE} per page)...")
+    pages = fetch_all_pages(seed['id'])
+    total = sum(len(page) for page in pages)
+    print(f"   {len(pages)} pages, {total} recommendations")
+
+    problems = page_problems(pages)
+    if problems:
+        print(f"❌ {'; '.join(problems)}")
+    elif total < MAX_DEPTH:
+        # Only a catalog smaller than the depth limit may end earlier
+        print(f"⚠️ Paging ended after {total} of {MAX_DEPTH} recommendations (small catalog?)")
+    else:
+        print(f"✅ Paging reached the {MAX_DEPTH}-recommendation depth limit without gaps")
+
+def test_filtered_paging(genre="Comedy", k=5):
+    print(f"\n2. Filtering recommendations to genre '{genre}'...")
+    seed = requests.get(f"{base_url}/api/movies").json()['movies'][0]
+    in_genre = requests.get(f"{base_url}/api/movies?genre={genre}").json()['movies']
+
+    data = requests.get(f"{base_url}/api/recommend/{seed['id']}?k={k}&genre={genre}").json()
+    recommendations = data.get('recommendations', [])
+    wrong_genre = [rec['id'] for rec in recommendations
+                   if genre not in requests.get(f"{base_url}/api/movie/{rec['id']}").json()['movie']['genres']]
+    if len(in_genre) > k and len(recommendations) != k:
+        print(f"❌ Got {len(recommendations)} of {k} recommendations although {len(in_genre)}+ {genre} movies exist")
+    elif wrong_genre:
+        print(f"❌ Recommendations outside the genre: {wrong_genre}")
+    else:
+        print(f"✅ {len(recommendations)} {genre} recommendations")
+
+    pages = fetch_all_pages(seed['id'], f"&genre={genre}")
+    problems = page_problems(pages)
+    if problems:
+        print(f"❌ Filtered paging: {'; '.join(problems)}")
+    else:
+        print(f"✅ Filtered paging: {len(pages)} pages, {sum(len(page) for page in pages)} recommendations without gaps")
+
+if __name__ == "__main__":
+    try:
+        test_paging()
+        test_filtered_paging()
+        print("\n🎉 Paging testing complete!")
+    except requests.exceptions.ConnectionError:
+        print("❌ Could not connect to the server. Make sure it's running on http://localhost:5000")
+    except Exception as e:
+        print(f"❌ Test failed: {e}")
@@ -0,0 +1,38 @@
+import numpy as np
+import scipy.sparse as sp
+from sklearn.preprocessing import normalize
+
+def tfidf_block(X, n_terms):
+    """CSR copy of the TF-IDF columns at the start of the feature matrix"""
+    block = X[:, :n_terms]
+    return block.tocsr() if sp.issparse(block) else sp.csr_matrix(np.asarray(block))
+
+class OverviewSearchIndex:
+    """Cosine search of free-text queries against the L2-normalized TF-IDF rows of every movie"""
+
+    def __init__(self, tfidf_matrix, tfidf_vectorizer):
+        self.vectorizer = tfidf_vectorizer
+        # Column-major so a query only touches the rows of its own terms
+        self.matrix = normalize(sp.csr_matrix(tfidf_matrix, dtype=np.float32)).tocsc()
+
+    @classmethod
+    def from_features(cls, X, tfidf_vectorizer):
+        """Index built from the text block of the weighted feature matrix"""
+        return cls(tfidf_block(X, len(tfidf_vectorizer.vocabulary_)), tfidf_vectorizer)
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def search(self, query, limit=20):
+        """(positions, cosine scores) of the best matching movies, best first"""
+        query_vector = normalize(self.vectorizer.transform([query])).tocsr()
+        if query_vector.nnz == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+        scores = self.matrix[:, query_vector.indices] @ query_vector.data.astype(np.float32)
+        positions = np.flatnonzero(scores > 0)
+        if len(positions) > limit:
+            positions = positions[np.argpartition(-scores[positions], limit - 1)[:limit]]
+        # Ties are broken by row position so results are deterministic
+        positions = positions[np.lexsort((positions, -scores[positions]))]
+        return positions, scores[positions].astype(np.float64)
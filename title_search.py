@@ -0,0 +1,198 @@
+import unicodedata
+from bisect import bisect_left, bisect_right
+import numpy as np
+
+# Longest character n-gram kept in the postings; longer queries intersect their n-grams
+NGRAM_SIZE = 3
+
+# Candidates checked per step when verifying or de-duplicating matches until the limit is filled
+MATCH_BLOCK = 256
+
+NO_POSITIONS = np.empty(0, dtype=np.int32)
+
+# Fraction of the query's trigrams a title must share to be a fuzzy match
+MIN_FUZZY_SIMILARITY = 0.4
+
+# Joins the folded titles of a movie into its single search key; never part of a query
+KEY_SEPARATOR = '\x1f'
+
+# Sorts after every character, so [prefix, prefix + PREFIX_END) spans all keys starting with prefix
+PREFIX_END = chr(0x10FFFF)
+
+def fold_text(text):
+    """Accent- and case-folded form of a title or query: NFKD, combining marks dropped, casefold"""
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).casefold()
+
+def title_ngrams(title, max_size=NGRAM_SIZE):
+    """Every distinct substring of a title up to max_size characters"""
+    return {title[start:start + size]
+            for size in range(1, max_size + 1)
+            for start in range(len(title) - size + 1)}
+
+def text_trigrams(text):
+    """Distinct trigrams of a string"""
+    return {text[start:start + NGRAM_SIZE] for start in range(len(text) - NGRAM_SIZE + 1)}
+
+class TitleSearchIndex:
+    """Character n-gram inverted index over accent- and case-folded titles for literal substring search"""
+
+    def __init__(self, title_columns):
+        # One key per movie covering every title column; missing (non-string) titles never match
+        folded_columns = [[fold_text(title) if isinstance(title, str) else '' for title in titles]
+                          for titles in title_columns]
+        folded = [list(dict.fromkeys(movie_titles)) for movie_titles in zip(*folded_columns)]
+        self.titles = np.array([KEY_SEPARATOR.join(movie_titles) for movie_titles in folded], dtype=str)
+
+        postings = {}
+        trigram_counts = []
+        for position, movie_titles in enumerate(folded):
+            # Grams never span two titles, so the separator cannot create matches
+            for gram in set().union(*(title_ngrams(title) for title in movie_titles)):
+                postings.setdefault(gram, []).append(position)
+            trigram_counts.append(len(set().union(*(text_trigrams(title) for title in movie_titles))))
+        # Positions are appended in row order, so every posting list is sorted
+        self.postings = {gram: np.array(positions, dtype=np.int32) for gram, positions in postings.items()}
+        self.trigram_counts = np.array(trigram_counts, dtype=np.int32)
+
+        # Every folded title once per movie in sorted order: exact and prefix matches are bisect ranges
+        sorted_titles = sorted({(title, position) for position, movie_titles in enumerate(folded)
+                                for title in movie_titles if title})
+        self.sorted_titles = [title for title, _ in sorted_titles]
+        self.sorted_positions = np.array([position for _, position in sorted_titles], dtype=np.int32)
+
+    def __len__(self):
+        return len(self.titles)
+
+    def candidates(self, query):
+        """Sorted positions whose titles contain every n-gram of the query"""
+        if len(query) <= NGRAM_SIZE:
+            return self.postings.get(query, NO_POSITIONS)
+
+        grams = sorted(text_trigrams(query),
+                       key=lambda gram: len(self.postings.get(gram, ())))
+        positions = self.postings.get(grams[0], NO_POSITIONS)
+        for gram in grams[1:]:
+            if len(positions) == 0:
+                break
+            positions = np.intersect1d(positions, self.postings.get(gram, NO_POSITIONS), assume_unique=True)
+        return positions
+
+    def search(self, query, limit=20, allowed=None):
+        """Positions of titles containing the literal query: exact, then prefix, then other matches, by row"""
+        query = fold_text(query).replace(KEY_SEPARATOR, '')
+        if not query:
+            return NO_POSITIONS
+
+        # Exact and prefix matches are ranges of the sorted titles, other matches come from the
+        # postings; each stage stops as soon as the limit is filled, so no key is scanned in full
+        start = bisect_left(self.sorted_titles, query)
+        exact_end = bisect_right(self.sorted_titles, query, start)
+        prefix_end = bisect_left(self.sorted_titles, query + PREFIX_END, exact_end)
+        stages = [np.unique(self.sorted_positions[start:exact_end]),
+                  np.unique(self.sorted_positions[start:prefix_end]),
+                  self.candidates(query)]
+
+        # Shared n-grams do not guarantee the query occurs as one substring
+        verify = (lambda positions: np.char.find(self.titles[positions], query) >= 0) if len(query) > NGRAM_SIZE else None
+        found = NO_POSITIONS
+        for stage, positions in enumerate(stages):
+            if len(found) >= limit:
+                break
+            # Filters apply before truncation, so filtered searches still fill the limit
+            if allowed is not None:
+                positions = positions[allowed[positions]]
+            found = np.concatenate([found, self._first_new(positions, found, limit - len(found),
+                                                           verify if stage == 2 else None)])
+        return found
+
+    def _first_new(self, positions, found, n, verify=None):
+        """First n positions, in order, that are not already found and pass the optional check"""
+        chosen = []
+        remaining = n
+        block_size = max(MATCH_BLOCK, n + len(found))
+        for block_start in range(0, len(positions), block_size):
+            block = positions[block_start:block_start + block_size]
+            block = block[~np.isin(block, found)]
+            if verify is not None and len(block):
+                block = block[verify(block)]
+            chosen.append(block[:remaining])
+            remaining -= len(chosen[-1])
+            if remaining <= 0:
+                break
+        return np.concatenate(chosen).astype(np.int32) if chosen else NO_POSITIONS
+
+    def fuzzy_search(self, query, limit=20, allowed=None, min_similarity=MIN_FUZZY_SIMILARITY):
+        """Literal matches first, then titles sharing most of the query's trigrams (typo tolerant)"""
+        exact = self.search(query, limit, allowed)
+        query = fold_text(query).replace(KEY_SEPARATOR, '')
+        trigrams = text_trigrams(query)
+        if len(exact) >= limit or not trigrams:
+            return exact
+
+        # Count shared trigrams per title from the postings alone, never scanning all titles
+        postings = [self.postings[gram] for gram in trigrams if gram in self.postings]
+        if not postings:
+            return exact
+        positions, shared = np.unique(np.concatenate(postings), return_counts=True)
+        if allowed is not None:
+            keep = allowed[positions]
+            positions, shared = positions[keep], shared[keep]
+
+        similarity = shared / len(trigrams)
+        keep = (similarity >= min_similarity) & ~np.isin(positions, exact)
+        positions, shared, similarity = positions[keep], shared[keep], similarity[keep]
+        # Equal coverage prefers titles with fewer extra trigrams, then catalog order
+        overlap = shared / (len(trigrams) + self.trigram_counts[positions] - shared)
+        order = np.lexsort((positions, -overlap, -similarity))[:limit - len(exact)]
+        return np.concatenate([exact, positions[order]])
+
+class TitleSuggestIndex:
+    """Presorted folded titles (original and localized) answering prefix queries with bisect"""
+
+    def __init__(self, title_columns, popularity, ids):
+        entries = set()
+        for titles in title_columns:
+            for position, title in enumerate(titles):
+                # Rows with malformed ids can never be opened from a suggestion
+                if isinstance(title, str) and title.strip() and ids[position] >= 0:
+                    entries.add((fold_text(title), position, title))
+        entries = sorted(entries)
+
+        self.keys = [key for key, _, _ in entries]
+        self.positions = np.array([position for _, position, _ in entries], dtype=np.int32)
+        self.titles = [title for _, _, title in entries]
+        self.popularity = np.asarray(popularity, dtype=np.float32)[self.positions]
+        self.ids = np.asarray(ids)[self.positions]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def suggest(self, prefix, limit=10):
+        """(id, title) of the most popular movies with a title starting with prefix"""
+        prefix = fold_text(prefix.lstrip())
+        if not prefix:
+            return []
+        start = bisect_left(self.keys, prefix)
+        end = bisect_left(self.keys, prefix + PREFIX_END, start)
+
+        # A movie matches through at most two titles, so 2 * limit entries always hold limit movies
+        entries = np.arange(start, end)
+        if len(entries) > 2 * limit:
+            # Keep every entry tied with the cutoff so equal popularity stays alphabetical
+            scores = self.popularity[start:end]
+            cutoff = -np.partition(-scores, 2 * limit - 1)[2 * limit - 1]
+            entries = entries[scores >= cutoff]
+        # Most popular first; equal popularity falls back to alphabetical order
+        entries = entries[np.lexsort((entries, -self.popularity[entries]))]
+
+        suggestions = []
+        seen = set()
+        for entry in entries.tolist():
+            position = int(self.positions[entry])
+            if position not in seen:
+                seen.add(position)
+                suggestions.append((int(self.ids[entry]), self.titles[entry]))
+                if len(suggestions) == limit:
+                    break
+        return suggestions